@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+# Настройки соединений с базой для ASGI (см. CONN_MAX_AGE в settings.py).
+os.environ.setdefault("WEB_ASGI", "1")
 
 application = get_asgi_application()
@@ -0,0 +1,31 @@
+"""
+Настройки gunicorn для продакшн-запуска (python manage.py serve).
+
+Все параметры задаются переменными окружения. В режиме ASGI процессы
+gunicorn запускают uvicorn-воркеры поверх app/asgi.py.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("WEB_THREADS", 4))
+
+if os.getenv("WEB_ASGI", "0") == "1":
+    wsgi_app = "app.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "app.wsgi:application"
+    worker_class = "gthread" if threads > 1 else "sync"
+
+# Плавный перезапуск воркеров: после max_requests запросов (со случайным
+# разбросом, чтобы воркеры не перезапускались одновременно) воркер
+# дообрабатывает текущие запросы и заменяется новым.
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 1000))
+timeout = int(os.getenv("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from pathlib import Path
 import dotenv
 import os
@@ -30,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "service_backend.metrics.MetricsMiddleware",
+    "service_backend.routers.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -72,10 +75,97 @@ DATABASES = {
         "PASSWORD": os.getenv("SQL_PASSWORD", "password"),
         "HOST": os.getenv("SQL_HOST", "localhost"),
         "PORT": os.getenv("SQL_PORT", "5432"),
-        'ATOMIC_REQUESTS': True,
+        # Запросы не оборачиваются в транзакцию целиком: чтения идут в
+        # autocommit, изменения - в коротких atomic() с блокировкой пары.
+        'ATOMIC_REQUESTS': False,
+        # Постоянные соединения: соединение переиспользуется между запросами
+        # и проверяется перед повторным использованием. Под ASGI (WEB_ASGI=1)
+        # Django 4.2 открывает отдельное соединение в каждом потоке
+        # sync_to_async, поэтому там соединения закрываются после запроса,
+        # а пул держит PgBouncer.
+        'CONN_MAX_AGE': 0 if int(os.getenv("WEB_ASGI", 0))
+        else int(os.getenv("SQL_CONN_MAX_AGE", 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Пул соединений через PgBouncer в режиме transaction pooling: серверные
+# курсоры в этом режиме не работают.
+if int(os.getenv("SQL_PGBOUNCER", 0)):
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
+# Реплики только для чтения (service_backend.routers): через пробел, для
+# SQLite - пути к файлам, для остальных СУБД - HOST или HOST:PORT.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(os.getenv("SQL_REPLICAS", "").split(), 1):
+    alias = f"replica{index}"
+    DATABASES[alias] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+    if DATABASES[alias]["ENGINE"] == "django.db.backends.sqlite3":
+        DATABASES[alias]["NAME"] = replica
+    else:
+        host, _, port = replica.partition(":")
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES["default"]["PORT"])
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["service_backend.routers.ReplicaRouter"]
+# Сколько секунд после изменения пользователь читает из основной базы.
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+
+
+# Число процессов gunicorn (app/gunicorn.conf.py): при нескольких
+# процессах service_backend.checks требует общий кэш.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", (os.cpu_count() or 1) * 2 + 1))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "friendship": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    } if REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "friendship",
+    },
+}
+
+# Кэш связей пользователя (service_backend.cache).
+FRIENDSHIP_CACHE_ALIAS = "friendship"
+FRIENDSHIP_CACHE_TIMEOUT = int(os.getenv("FRIENDSHIP_CACHE_TIMEOUT", 300))
+# Пользователи с большим числом связей не кэшируются и читаются из базы.
+FRIENDSHIP_CACHE_MAX_SIZE = int(os.getenv("FRIENDSHIP_CACHE_MAX_SIZE", 10000))
+
+
+# Индекс графа дружбы в памяти процесса (service_backend.graph).
+FRIEND_GRAPH_MAX_AGE = int(os.getenv("FRIEND_GRAPH_MAX_AGE", 300))
+FRIEND_GRAPH_MAX_CHANGES = int(os.getenv("FRIEND_GRAPH_MAX_CHANGES", 100000))
+# Сколько пользователей отдают эндпойнты общих друзей и рекомендаций.
+FRIEND_GRAPH_RESULTS_LIMIT = 100
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/4.2/topics/auth/passwords/
+
+# Хэшер для новых паролей и его стоимость настраиваются для каждого окружения.
+PASSWORD_HASHERS = list(dict.fromkeys([
+    os.getenv("PASSWORD_HASHER", "service_backend.hashing.TunablePBKDF2PasswordHasher"),
+    "service_backend.hashing.TunablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]))
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", 600000))
+# Размер пула потоков, в котором считаются хэши паролей (service_backend.hashing).
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -121,15 +211,72 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "service_backend.User"
 
+# Режим JWT: короткоживущие подписанные access-токены (Authorization: Bearer ...)
+# проверяются без обращения к базе; работает вместе с обычными токенами.
+AUTH_JWT = int(os.getenv("AUTH_JWT", 0))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'service_backend.authentication.CachedTokenAuthentication',
+    ] + ([
+        'service_backend.authentication.StatelessJWTAuthentication',
+    ] if AUTH_JWT else []),
+    # orjson, если установлен; иначе стандартный json (service_backend.renderers).
+    'DEFAULT_RENDERER_CLASSES': [
+        'service_backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'service_backend.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv("JWT_ACCESS_MINUTES", 5))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.getenv("JWT_REFRESH_DAYS", 7))),
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'UPDATE_LAST_LOGIN': False,
+}
+
+if AUTH_JWT:
+    INSTALLED_APPS.append('rest_framework_simplejwt.token_blacklist')
+
+# Кэш токенов в памяти процесса (service_backend.authentication).
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 60))
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", 100000))
+
+# Максимальное число пользователей в одном запросе api/status/ (POST).
+STATUS_BATCH_MAX_SIZE = int(os.getenv("STATUS_BATCH_MAX_SIZE", 200))
+
+# Максимальное число пользователей в массовой отправке/принятии заявок.
+BULK_APPLICATION_MAX_SIZE = int(os.getenv("BULK_APPLICATION_MAX_SIZE", 200))
+
+# События дружбы для клиентов (service_backend.events): бэкенд доставки
+# между процессами, размер очереди соединения, интервал пингов и время
+# жизни потока в секундах.
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "service_backend.events.RedisBackend"
+                           if REDIS_URL else "service_backend.events.LocalBackend")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 100))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+EVENTS_STREAM_SECONDS = float(os.getenv("EVENTS_STREAM_SECONDS", 300))
+
+# Срок жизни заявки в друзья в днях (0 - бессрочно): более старые заявки
+# удаляет команда purge_applications.
+APPLICATION_TTL_DAYS = int(os.getenv("APPLICATION_TTL_DAYS", 30))
+
+# Метрики запросов (service_backend.metrics): SQL-запросы дольше порога
+# в миллисекундах пишутся в лог, не больше заданного числа на запрос.
+METRICS_SLOW_QUERY_MS = float(os.getenv("METRICS_SLOW_QUERY_MS", 100))
+METRICS_SLOW_QUERY_LOG_LIMIT = int(os.getenv("METRICS_SLOW_QUERY_LOG_LIMIT", 5))
+# Сети, с которых доступен /metrics без входа администратора (через пробел).
+METRICS_ALLOWED_NETWORKS = os.getenv("METRICS_ALLOWED_NETWORKS", "127.0.0.1/32 ::1/128").split()
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGIN_FIELD': 'username',
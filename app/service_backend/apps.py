@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ServiceBackendConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "service_backend"
+
+    def ready(self):
+        from service_backend import authentication, checks  # noqa: F401
@@ -0,0 +1,262 @@
+"""
+Асинхронные версии самых нагруженных эндпойнтов (api/async/...).
+
+Работают на асинхронном ORM Django и обслуживаются через app/asgi.py без
+блокировки потока на время запросов к базе. Ответы совпадают с
+синхронными эндпойнтами DRF, списки пагинируются параметром before.
+Операции, которым нужна транзакция, выполняются в sync_to_async внутри atomic().
+Здесь же поток событий дружбы api/async/events/ (service_backend.events).
+"""
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers, status
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from service_backend.authentication import (
+    StatelessJWTAuthentication, remember, token_cache, token_row, user_from_cache
+)
+from service_backend.cache import friendship_cache
+from service_backend.events import ACCEPTED, APPLICATION, event_broker, stream
+from service_backend.graph import friend_graph
+from service_backend.models import (
+    Application, Friendship, User, bump_counters, lock_users
+)
+from service_backend.renderers import dumps
+from service_backend.routers import read_from_replica
+from service_backend.serializers import (
+    ApplicationSerializer, FollowSerializer, StatusSerializer
+)
+
+
+def _response(data, code=status.HTTP_200_OK):
+    return HttpResponse(dumps(data), status=code, content_type='application/json')
+
+
+def _error(message, code=status.HTTP_400_BAD_REQUEST):
+    return _response({'status': 'error', 'code': code, 'message': message}, code)
+
+
+_datetime_field = serializers.DateTimeField()
+
+
+async def _authenticate(request):
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword == 'Bearer' and key and settings.AUTH_JWT:
+        authentication = StatelessJWTAuthentication()
+        try:
+            return authentication.get_user(authentication.get_validated_token(key))
+        except InvalidToken:
+            return None
+    if keyword != 'Token' or not key:
+        return None
+    cached = token_cache.get(key)
+    if cached is not None:
+        return user_from_cache(*cached)
+    return remember(key, await token_row(Token.objects.filter(key=key)).afirst())
+
+
+def async_api_view(methods):
+    """
+    Аналог api_view для асинхронных представлений: проверяет метод и
+    токен и отключает CSRF для представления.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return _response(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+            request.user = await _authenticate(request)
+            if request.user is None:
+                return _response(
+                    {'detail': 'Authentication credentials were not provided.'},
+                    status.HTTP_401_UNAUTHORIZED,
+                )
+            return await view(request, *args, **kwargs)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def _page_size(request):
+    try:
+        page_size = int(request.GET.get('page_size', 100))
+    except ValueError:
+        page_size = 100
+    return max(1, min(page_size, 1000))
+
+
+def _next_link(request, before):
+    query = request.GET.copy()
+    query['before'] = before
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+@sync_to_async
+def _send_application(user, applicant):
+    """
+    Отправляет заявку под блокировкой пары, как синхронный эндпойнт.
+    Возвращает (код ответа, сообщение об ошибке или заявка).
+    """
+    with transaction.atomic():
+        lock_users(user, applicant)
+        if Friendship.objects.between(user, applicant).exists():
+            return status.HTTP_400_BAD_REQUEST, 'You are already friends.'
+        deleted, _ = Application.objects.filter(user=applicant, applicant=user).delete()
+        if deleted:
+            Friendship.objects.create(user1=user, user2=applicant)
+            bump_counters(
+                (applicant, 'outgoing_count', -1), (user, 'incoming_count', -1),
+                (user, 'friend_count', 1), (applicant, 'friend_count', 1),
+            )
+            friendship_cache.invalidate(user, applicant)
+            friend_graph.on_friendship_created(user, applicant)
+            event_broker.publish(user, ACCEPTED, applicant)
+            return status.HTTP_201_CREATED, 'You became friends.'
+        try:
+            with transaction.atomic(savepoint=False):
+                application = Application.objects.create(user=user, applicant=applicant)
+        except IntegrityError:
+            return (status.HTTP_400_BAD_REQUEST,
+                    'Application with this user and applicant already exists.')
+        bump_counters((user, 'outgoing_count', 1), (applicant, 'incoming_count', 1))
+        friendship_cache.invalidate(user, applicant)
+        event_broker.publish(user, APPLICATION, applicant)
+        return status.HTTP_201_CREATED, application
+
+
+@async_api_view(['POST'])
+async def application_send(request):
+    try:
+        username = json.loads(request.body)['applicant']
+        applicant = await User.objects.aget(username=username)
+    except (ValueError, KeyError, TypeError):
+        return _error('The request is incorrect.')
+    except User.DoesNotExist:
+        return _response({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+    user = request.user
+    if user.pk == applicant.pk:
+        return _error("You can't add yourself as a friend.")
+    code, result = await _send_application(user, applicant)
+    if code == status.HTTP_400_BAD_REQUEST:
+        return _error(result)
+    if isinstance(result, str):
+        return _response(
+            {'status': 'success', 'code': code, 'message': result}, code)
+    return _response({
+        'id': result.id,
+        'user': user.username,
+        'applicant': applicant.username,
+        'created_at': _datetime_field.to_representation(result.created_at),
+    }, code)
+
+
+@async_api_view(['GET'])
+@read_from_replica
+async def friendship_status(request, username):
+    status_friend = await StatusSerializer.annotate(
+        User.objects.filter(username=username), request.user,
+    ).values_list('status', flat=True).afirst()
+    if status_friend is None:
+        return _response(
+            {'status': 'error', 'message': 'The specified username does not exist.'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+    return _response({'username': username, 'status': status_friend})
+
+
+@async_api_view(['GET'])
+@read_from_replica
+async def friend_list(request):
+    before = request.GET.get('before')
+    if before:
+        if not before.isdigit():
+            return _error('Invalid before.')
+        before = int(before)
+    page_size = _page_size(request)
+    rows = [row async for row in Friendship.objects.friends_page(
+        request.user, page_size + 1, before=before or None)]
+    results = FollowSerializer.represent_rows(rows[:page_size])
+    next_link = None
+    if len(rows) > page_size:
+        next_link = _next_link(request, rows[page_size - 1]['id'])
+    return _response({'next': next_link, 'results': results})
+
+
+async def _application_list(request, queryset):
+    """
+    Страница заявок по убыванию (created_at, id). Курсор before имеет вид
+    "<created_at>,<id>" и указывает на последнюю заявку предыдущей страницы.
+    """
+    since = request.GET.get('since')
+    if since:
+        since = parse_datetime(since)
+        if since is None:
+            return _error('Invalid since.')
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        queryset = queryset.filter(created_at__gt=since)
+    before = request.GET.get('before')
+    if before:
+        created_at, _, application_id = before.rpartition(',')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not application_id.isdigit():
+            return _error('Invalid before.')
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at)
+            | Q(created_at=created_at, id__lt=int(application_id))
+        )
+    page_size = _page_size(request)
+    rows = [
+        row async for row in queryset.order_by('-created_at', '-id').values(
+            *ApplicationSerializer.ROW_FIELDS)[:page_size + 1]
+    ]
+    results = ApplicationSerializer.represent_rows(rows[:page_size])
+    next_link = None
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        next_link = _next_link(request, f"{last['created_at'].isoformat()},{last['id']}")
+    return _response({'next': next_link, 'results': results})
+
+
+@async_api_view(['GET'])
+@read_from_replica
+async def application_incoming(request):
+    return await _application_list(
+        request, Application.objects.filter(applicant=request.user))
+
+
+@async_api_view(['GET'])
+@read_from_replica
+async def application_outgoing(request):
+    return await _application_list(
+        request, Application.objects.filter(user=request.user))
+
+
+@async_api_view(['GET'])
+async def events(request):
+    """
+    Поток Server-Sent Events с событиями дружбы текущего пользователя
+    вместо опроса списков заявок и статусов. Только под ASGI: WSGI-сервер
+    читал бы асинхронный поток синхронно, держа поток воркера до конца
+    потока и не отдавая события по мере появления.
+    """
+    if not isinstance(request, ASGIRequest):
+        return _error('Events are available only under ASGI.', status.HTTP_501_NOT_IMPLEMENTED)
+    response = StreamingHttpResponse(stream(request.user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Запрещает nginx буферизовать поток.
+    response['X-Accel-Buffering'] = 'no'
+    return response
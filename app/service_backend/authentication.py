@@ -0,0 +1,143 @@
+"""
+Аутентификация по токену с кэшем в памяти процесса.
+
+Стандартный TokenAuthentication на каждый запрос выбирает токен вместе
+с пользователем. Здесь ключ токена сопоставляется с (id, username)
+пользователя в ограниченном по размеру кэше с TTL, а request.user
+собирается из этих полей без запроса к базе. Записи удаляются при
+удалении токена и при любом изменении пользователя в этом процессе;
+в остальных процессах изменения применяются не позже чем через
+TOKEN_CACHE_TTL секунд.
+
+StatelessJWTAuthentication - необязательный режим без обращения к базе:
+короткоживущий access-токен подписан SECRET_KEY и содержит id и username
+пользователя, поэтому проверяется только подписью.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from service_backend.models import User
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш ограниченного размера с временем жизни записей."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+USERNAME_CLAIM = 'username'
+
+token_cache = TTLCache(settings.TOKEN_CACHE_MAX_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+def user_from_cache(user_id, username):
+    """Пользователь, собранный из закэшированных полей, без запроса к базе."""
+    user = User(id=user_id, username=username, is_active=True)
+    user._state.adding = False
+    user._state.db = 'default'
+    return user
+
+
+def remember(key, row):
+    """
+    Кэширует строку (user_id, username, is_active) для ключа токена и
+    возвращает пользователя; None, если токена нет или пользователь неактивен.
+    """
+    if row is None or not row[2]:
+        return None
+    token_cache.set(key, (row[0], row[1]))
+    return user_from_cache(row[0], row[1])
+
+
+def token_row(queryset):
+    return queryset.values_list('user_id', 'user__username', 'user__is_active')
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            user = user_from_cache(*cached)
+        else:
+            row = token_row(Token.objects.filter(key=key)).first()
+            if row is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            user = remember(key, row)
+            if user is None:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user, Token(key=key, user=user)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Проверяет access-токен (Authorization: Bearer ...) только по подписи
+    и сроку действия и собирает пользователя из его claims без запроса к базе.
+    Отзыв выполняется через чёрный список refresh-токенов: после отзыва
+    access-токен перестаёт продлеваться и истекает через ACCESS_TOKEN_LIFETIME.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            return user_from_cache(
+                validated_token[jwt_settings.USER_ID_CLAIM],
+                validated_token[USERNAME_CLAIM],
+            )
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        token_cache.delete(key)
@@ -0,0 +1,154 @@
+"""
+Общие инструменты для команд-бенчмарков.
+
+Бенчмарки запускаются на отдельной тестовой базе, которая создаётся
+перед замером и удаляется после него, поэтому рабочие данные не трогаются.
+"""
+import http.client
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.db import connection
+
+from service_backend.models import Application, Friendship, User
+
+BATCH_SIZE = 10000
+
+
+@contextmanager
+def bench_database(keep=False):
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keep)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
+
+
+def seed_users(count, prefix='bench'):
+    """Создаёт пользователей пачками и возвращает список их id."""
+    for start in range(0, count, BATCH_SIZE):
+        User.objects.bulk_create(
+            User(username=f'{prefix}{i}', password='!')
+            for i in range(start, min(start + BATCH_SIZE, count))
+        )
+    return list(User.objects.order_by('id').values_list('id', flat=True))
+
+
+def seed_friendships(user_ids, count, seed=0):
+    """Создаёт count случайных уникальных пар в каноническом порядке."""
+    rng = random.Random(seed)
+    seen = set()
+    batch = []
+    while len(seen) < count:
+        pair = Friendship.canonical(*rng.sample(user_ids, 2))
+        if pair in seen:
+            continue
+        seen.add(pair)
+        batch.append(Friendship(user1_id=pair[0], user2_id=pair[1]))
+        if len(batch) == BATCH_SIZE:
+            Friendship.objects.bulk_create(batch)
+            batch = []
+    Friendship.objects.bulk_create(batch)
+    return seen
+
+
+def seed_celebrities(user_ids, count, fans, seed=0):
+    """
+    Делает первых count пользователей "знаменитостями": у каждого fans
+    друзей. Возвращает множество созданных пар.
+    """
+    rng = random.Random(seed)
+    pairs = set()
+    for celebrity_id in user_ids[:count]:
+        for fan_id in rng.sample(user_ids[count:], min(fans, len(user_ids) - count)):
+            pairs.add(Friendship.canonical(celebrity_id, fan_id))
+    for start in range(0, len(pairs), BATCH_SIZE):
+        Friendship.objects.bulk_create(
+            [Friendship(user1_id=user1_id, user2_id=user2_id)
+             for user1_id, user2_id in list(pairs)[start:start + BATCH_SIZE]],
+            ignore_conflicts=True,
+        )
+    return pairs
+
+
+def seed_applications(user_ids, count, exclude=(), seed=0):
+    """
+    Создаёт count случайных заявок (user, applicant) между пользователями,
+    которые не входят в пары exclude и не подали встречную заявку.
+    """
+    rng = random.Random(seed)
+    exclude = set(exclude)
+    seen = set()
+    batch = []
+    while len(seen) < count:
+        user_id, applicant_id = rng.sample(user_ids, 2)
+        pair = Friendship.canonical(user_id, applicant_id)
+        if pair in exclude or pair in seen:
+            continue
+        seen.add(pair)
+        batch.append(Application(user_id=user_id, applicant_id=applicant_id))
+        if len(batch) == BATCH_SIZE:
+            Application.objects.bulk_create(batch)
+            batch = []
+    Application.objects.bulk_create(batch)
+    return seen
+
+
+def measure(func, repeat):
+    """Возвращает список времён выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def summary(timings):
+    return (
+        f'mean={statistics.mean(timings):.3f}ms '
+        f'p50={statistics.median(timings):.3f}ms '
+        f'p99={percentile(timings, 0.99):.3f}ms'
+    )
+
+
+def http_load(base_url, path, token, concurrency, total):
+    """
+    Отправляет total GET-запросов к запущенному серверу в concurrency
+    потоков с keep-alive. Возвращает (RPS, времена успешных запросов, ошибки).
+    """
+    url = urlsplit(base_url)
+    local = threading.local()
+    headers = {'Authorization': f'Token {token}'}
+
+    def request(_):
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection(url.hostname, url.port)
+        started = time.perf_counter()
+        try:
+            local.connection.request('GET', path, headers=headers)
+            response = local.connection.getresponse()
+            response.read()
+            ok = response.status < 500
+        except (OSError, http.client.HTTPException):
+            del local.connection
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(request, range(total)))
+    elapsed = time.perf_counter() - started
+    timings = [timing for timing, ok in results if ok]
+    return total / elapsed, timings, len(results) - len(timings)
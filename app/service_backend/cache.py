@@ -0,0 +1,199 @@
+"""
+Кэш связей пользователя: друзья, входящие и исходящие заявки.
+
+Для каждого пользователя хранится одна запись (friends, incoming, outgoing)
+из множеств id. Запись заполняется в фоне после первого промаха и
+сбрасывается после коммита транзакции, изменившей связи пользователя.
+
+Поколения и записи должны быть общими для всех процессов сервиса: при
+нескольких воркерах кэш "friendship" должен быть в Redis (REDIS_URL),
+иначе сброс виден только процессу, сделавшему изменение. Это проверяет
+service_backend.checks.
+
+Ключ записи содержит номер поколения пользователя. Сброс увеличивает
+поколение, поэтому запись, прочитанная из базы до коммита и сохранённая
+после него, попадает под старый ключ и больше не читается.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+
+from service_backend.models import Application, Friendship, FriendshipStatus, User
+from service_backend.routers import mark_written, primary_reads
+
+LOCK_TIMEOUT = 5
+TOO_LARGE = 'too-large'
+
+logger = logging.getLogger(__name__)
+
+# Записи загружаются в одном фоновом потоке на процесс.
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='friendship-cache')
+
+
+class Relations(namedtuple('Relations', ('friends', 'incoming', 'outgoing'))):
+
+    def status(self, user_id, other_id):
+        """Статус дружбы user_id с other_id, тот же порядок проверок, что и в SQL."""
+        if other_id in self.friends:
+            return FriendshipStatus.FRIENDS
+        if other_id == user_id:
+            return FriendshipStatus.YOURSELF
+        if other_id in self.incoming:
+            return FriendshipStatus.INCOMING
+        if other_id in self.outgoing:
+            return FriendshipStatus.OUTGOING
+        return FriendshipStatus.NOTHING
+
+
+class FriendshipCache:
+
+    def __init__(self):
+        self._counters = {'hits': 0, 'misses': 0}
+        self._counters_lock = threading.Lock()
+        # Ключи, загрузка которых уже стоит в очереди этого процесса.
+        self._loading = set()
+        self._loading_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.FRIENDSHIP_CACHE_ALIAS]
+
+    def _count(self, name):
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        """Попадания и промахи с запуска процесса (отдаются на /metrics)."""
+        with self._counters_lock:
+            return dict(self._counters)
+
+    def _generation(self, user_id):
+        key = f'friendship:gen:{user_id}'
+        generation = self.cache.get(key)
+        if generation is None:
+            # Поколение начинается с текущего времени, чтобы после вытеснения
+            # ключа не вернуться к номеру, под которым лежат старые записи.
+            self.cache.add(key, time.time_ns(), timeout=None)
+            generation = self.cache.get(key)
+        return generation
+
+    @staticmethod
+    def _load(user_id):
+        """
+        Загружает связи из базы. Возвращает None, если связей больше
+        FRIENDSHIP_CACHE_MAX_SIZE: такие пользователи читаются напрямую из базы.
+        """
+        limit = settings.FRIENDSHIP_CACHE_MAX_SIZE + 1
+        # Запись живёт до следующего сброса, поэтому читается из основной
+        # базы: отставшая реплика закэшировала бы устаревшие связи.
+        with primary_reads():
+            pairs = Friendship.objects.of(user_id).values_list(
+                'user1_id', 'user2_id').order_by()[:limit]
+            incoming = Application.objects.filter(
+                applicant=user_id).values_list('user_id', flat=True).order_by()[:limit]
+            outgoing = Application.objects.filter(
+                user=user_id).values_list('applicant_id', flat=True).order_by()[:limit]
+            relations = Relations(
+                frozenset(user2_id if user1_id == user_id else user1_id
+                          for user1_id, user2_id in pairs),
+                frozenset(incoming),
+                frozenset(outgoing),
+            )
+        if sum(len(ids) for ids in relations) > settings.FRIENDSHIP_CACHE_MAX_SIZE:
+            return None
+        return relations
+
+    def _key(self, user_id):
+        return f'friendship:rel:{user_id}:{self._generation(user_id)}'
+
+    def relations(self, user_id):
+        """
+        Связи пользователя, если они уже есть в кэше, без обращения к базе.
+        При промахе возвращает None, а запись загружается в фоновом потоке
+        после коммита текущей транзакции: сам запрос отвечает одним
+        SQL-запросом, а не загрузкой всех связей. Для пользователей со
+        слишком большим числом связей всегда None.
+        """
+        key = self._key(user_id)
+        relations = self.cache.get(key)
+        if relations is not None:
+            self._count('hits')
+            return None if relations == TOO_LARGE else relations
+        self._count('misses')
+        transaction.on_commit(lambda: self._schedule(user_id, key))
+        return None
+
+    def _schedule(self, user_id, key):
+        """
+        Ставит загрузку записи в очередь, если её там ещё нет: серия
+        промахов по одному пользователю даёт одну загрузку, а не очередь
+        из одинаковых задач.
+        """
+        with self._loading_lock:
+            if key in self._loading:
+                return
+            self._loading.add(key)
+        _loader.submit(self._fill, user_id, key)
+
+    def _fill(self, user_id, key):
+        """Загружает запись в фоне; пока её загружает одна копия сервиса, остальные пропускают."""
+        lock_key = f'{key}:lock'
+        try:
+            if self.cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+                try:
+                    if self.cache.get(key) is None:
+                        relations = self._load(user_id)
+                        self.cache.set(
+                            key, TOO_LARGE if relations is None else relations,
+                            timeout=settings.FRIENDSHIP_CACHE_TIMEOUT,
+                        )
+                finally:
+                    self.cache.delete(lock_key)
+        except Exception:
+            logger.exception('Failed to load relations of user %s', user_id)
+        finally:
+            with self._loading_lock:
+                self._loading.discard(key)
+            close_old_connections()
+
+    def wait_loads(self):
+        """Ждёт окончания уже запущенных фоновых загрузок (для бенчмарков)."""
+        _loader.submit(lambda: None).result()
+
+    def user_id(self, username):
+        """id пользователя по username; None, если пользователя нет."""
+        key = f'friendship:uid:{username}'
+        user_id = self.cache.get(key)
+        if user_id is not None:
+            self._count('hits')
+            return user_id
+        self._count('misses')
+        user_id = User.objects.filter(
+            username=username).values_list('id', flat=True).first()
+        if user_id is not None:
+            self.cache.set(key, user_id, timeout=settings.FRIENDSHIP_CACHE_TIMEOUT)
+        return user_id
+
+    def invalidate(self, *user_ids):
+        """
+        Сбрасывает записи пользователей после коммита текущей транзакции
+        и закрепляет их за основной базой (routers.mark_written).
+        """
+        def bump():
+            mark_written(*user_ids)
+            for user_id in user_ids:
+                key = f'friendship:gen:{getattr(user_id, "pk", user_id)}'
+                try:
+                    self.cache.incr(key)
+                except ValueError:
+                    self.cache.set(key, time.time_ns(), timeout=None)
+        transaction.on_commit(bump)
+
+
+friendship_cache = FriendshipCache()
@@ -0,0 +1,44 @@
+"""
+Проверки конфигурации для запуска в несколько процессов.
+
+Выполняются командой serve перед запуском gunicorn и командой
+check --deploy. Число процессов берётся из WEB_WORKERS.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+WORKERS_TAG = 'workers'
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+LOCAL_EVENTS_BACKEND = 'service_backend.events.LocalBackend'
+
+
+@register(WORKERS_TAG, deploy=True)
+def check_shared_friendship_cache(app_configs, **kwargs):
+    """
+    Кэш связей и закрепления за основной базой должны быть общими для
+    воркеров: иначе сброс записи или закрепление видны только процессу,
+    сделавшему изменение.
+    """
+    backend = settings.CACHES[settings.FRIENDSHIP_CACHE_ALIAS]['BACKEND']
+    if settings.WEB_WORKERS > 1 and backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f'Cache "{settings.FRIENDSHIP_CACHE_ALIAS}" uses {backend}, which is '
+            f'not shared between {settings.WEB_WORKERS} workers.',
+            hint='Set REDIS_URL or run a single worker (WEB_WORKERS=1).',
+            id='service_backend.E001',
+        )]
+    return []
+
+
+@register(WORKERS_TAG, deploy=True)
+def check_shared_events_backend(app_configs, **kwargs):
+    """LocalBackend доставляет события только подписчикам своего процесса."""
+    if settings.WEB_WORKERS > 1 and settings.EVENTS_BACKEND == LOCAL_EVENTS_BACKEND:
+        return [Error(
+            f'EVENTS_BACKEND {LOCAL_EVENTS_BACKEND} does not deliver events '
+            f'between {settings.WEB_WORKERS} workers.',
+            hint='Set REDIS_URL (RedisBackend) or run a single worker (WEB_WORKERS=1).',
+            id='service_backend.E002',
+        )]
+    return []
@@ -0,0 +1,196 @@
+"""
+События дружбы для клиентов в реальном времени (Server-Sent Events).
+
+Изменяющие эндпойнты вызывают publish после коммита транзакции: событие
+получает пользователь, которого оно касается. Типы событий:
+application - новая входящая заявка, accepted и rejected - ответ на
+исходящую заявку, unfriended - удаление из друзей.
+
+Каждый процесс держит Broker: подписчики - это asyncio.Queue по id
+пользователя, без потоков и опроса, поэтому тысячи простаивающих
+соединений почти ничего не стоят. Между процессами события передаёт
+бэкенд EVENTS_BACKEND: LocalBackend доставляет их только внутри процесса
+(поэтому при нескольких воркерах его не пропускает service_backend.checks),
+RedisBackend - всем процессам через Redis pub/sub. Поток отдаётся только
+под ASGI.
+
+Django 4.2 не сообщает потоковому ответу об отключении клиента, поэтому
+поток закрывается через EVENTS_STREAM_SECONDS, и EventSource
+переподключается сам.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from service_backend.renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+APPLICATION = 'application'
+ACCEPTED = 'accepted'
+REJECTED = 'rejected'
+UNFRIENDED = 'unfriended'
+
+
+class Subscriber:
+    """Очередь событий одного соединения в его цикле событий."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент: поток закрывается, клиент переподключится
+            # и перечитает списки заявок.
+            self.overflowed = True
+
+
+class Broker:
+
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.backend = None
+
+    def _backend(self):
+        with self.lock:
+            if self.backend is None:
+                self.backend = import_string(settings.EVENTS_BACKEND)(self.deliver)
+            return self.backend
+
+    def subscribe(self, user_id):
+        self._backend().start()
+        subscriber = Subscriber(user_id)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(subscriber.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[subscriber.user_id]
+
+    def deliver(self, events):
+        """Раздаёт события [(id получателя, событие), ...] подписчикам процесса."""
+        with self.lock:
+            targets = [
+                (subscriber, event)
+                for user_id, event in events
+                for subscriber in self.subscribers.get(user_id, ())
+            ]
+        for subscriber, event in targets:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.put, event)
+            except RuntimeError:  # цикл событий соединения уже закрыт
+                self.unsubscribe(subscriber)
+
+    def publish(self, actor, kind, *recipients):
+        """
+        Отправляет событие kind от пользователя actor получателям (объекты
+        или id) после коммита текущей транзакции.
+        """
+        event = {
+            'event': kind,
+            'user': actor.username,
+            'created_at': timezone.now().isoformat(),
+        }
+        events = [(getattr(recipient, 'pk', recipient), event) for recipient in recipients]
+        if events:
+            transaction.on_commit(lambda: self._backend().publish(events))
+
+
+class LocalBackend:
+    """События доставляются только подписчикам этого же процесса."""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def start(self):
+        pass
+
+    def publish(self, events):
+        self.deliver(events)
+
+
+class RedisBackend:
+    """
+    События публикуются в канал Redis (REDIS_URL) одним сообщением на
+    вызов publish; поток-слушатель в каждом процессе с подписчиками
+    раздаёт их своему Broker.
+    """
+    channel = 'service_backend:events'
+
+    def __init__(self, deliver):
+        import redis
+
+        self.deliver = deliver
+        self.client = redis.Redis.from_url(settings.REDIS_URL)
+        self.listener = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(
+                    target=self._listen, name='events-redis', daemon=True)
+                self.listener.start()
+
+    def publish(self, events):
+        try:
+            self.client.publish(self.channel, dumps(events))
+        except Exception:
+            # Событие не должно ломать уже закоммиченный запрос.
+            logger.exception('Failed to publish %d events', len(events))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.deliver([tuple(item) for item in json.loads(message['data'])])
+            except Exception:
+                logger.exception('Event listener failed, reconnecting')
+                time.sleep(1)
+
+
+event_broker = Broker()
+
+
+def _message(event):
+    return b'event: %s\ndata: %s\n\n' % (event['event'].encode(), dumps(event))
+
+
+async def stream(user):
+    """Поток SSE для пользователя user: события и комментарии-пинги."""
+    subscriber = event_broker.subscribe(user.pk)
+    deadline = time.monotonic() + settings.EVENTS_STREAM_SECONDS
+    try:
+        yield b'retry: 3000\n\n'
+        while not subscriber.overflowed:
+            timeout = min(settings.EVENTS_HEARTBEAT_SECONDS, deadline - time.monotonic())
+            if timeout <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield b': ping\n\n'
+                continue
+            yield _message(event)
+    finally:
+        event_broker.unsubscribe(subscriber)
@@ -0,0 +1,114 @@
+"""
+Потоковая выгрузка дружб и заявок в NDJSON или CSV.
+
+Строки читаются из базы порциями по CHUNK_SIZE через серверный курсор
+(iterator(chunk_size=...)) и сразу сериализуются, поэтому расход памяти
+не зависит от размера выгрузки. Поля совпадают с форматом import_graph:
+выгрузку можно загрузить обратно без преобразований.
+"""
+import csv
+import io
+import itertools
+import json
+import zlib
+
+from django.db import connections
+from django.db.models import Q
+
+from service_backend.models import Application, Friendship
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+KINDS = {
+    'friendships': ('user1', 'user2'),
+    'applications': ('user', 'applicant', 'created_at'),
+}
+
+
+def _rows(queryset, fields):
+    """
+    Строки values_list(*fields) в порядке id. Без серверных курсоров
+    (PgBouncer) iterator() получил бы всю выборку разом, поэтому в этом
+    случае строки читаются страницами по первичному ключу.
+    """
+    queryset = queryset.order_by()
+    if not connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        yield from queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+        return
+    last_id = 0
+    while True:
+        page = list(queryset.filter(id__gt=last_id).order_by('id').values_list(
+            'id', *fields)[:CHUNK_SIZE])
+        for row in page:
+            yield row[1:]
+        if len(page) < CHUNK_SIZE:
+            return
+        last_id = page[-1][0]
+
+
+def rows(kind, user=None):
+    """Строки выгрузки kind: весь граф или только связи пользователя user."""
+    if kind == 'friendships':
+        queryset = Friendship.objects.all()
+        if user is not None:
+            queryset = queryset.of(user)
+        return _rows(queryset, ('user1__username', 'user2__username'))
+    queryset = Application.objects.all()
+    if user is not None:
+        queryset = queryset.filter(Q(user=user) | Q(applicant=user))
+    return (
+        (user, applicant, created_at.isoformat())
+        for user, applicant, created_at in _rows(
+            queryset, ('user__username', 'applicant__username', 'created_at'))
+    )
+
+
+def _buffered(lines):
+    """Склеивает строки в куски около BUFFER_SIZE байт."""
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def _ndjson_lines(fields, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n'
+
+
+def _csv_lines(fields, rows):
+    line = io.StringIO()
+    writer = csv.writer(line)
+    for row in itertools.chain((fields,), rows):
+        writer.writerow(row)
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+
+
+def stream(kind, output_format, user=None):
+    """Итератор байтовых кусков выгрузки kind в формате output_format."""
+    fields = KINDS[kind]
+    lines = _ndjson_lines if output_format == 'ndjson' else _csv_lines
+    return _buffered(lines(fields, rows(kind, user)))
+
+
+def gzipped(chunks):
+    """Сжимает поток кусков в gzip на лету."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
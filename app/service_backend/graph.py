@@ -0,0 +1,209 @@
+"""
+Индекс графа дружбы в памяти процесса.
+
+Граф хранится в формате CSR: массив offsets, индексируемый id пользователя,
+и общий массив neighbors, где друзья пользователя u лежат отсортированными
+в neighbors[offsets[u]:offsets[u + 1]]. Изменения после построения
+накапливаются в небольших множествах added/removed; когда их становится
+много или индекс устаревает, он перестраивается из базы в фоновом потоке.
+
+Каждый процесс держит свою копию, поэтому изменения, сделанные другими
+процессами, становятся видны не позже чем через FRIEND_GRAPH_MAX_AGE секунд.
+"""
+import heapq
+import logging
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from service_backend.models import Friendship
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 10000
+
+
+class FriendGraph:
+
+    def __init__(self, offsets, neighbors):
+        self.offsets = offsets
+        self.neighbors_array = neighbors
+        self.built_at = time.monotonic()
+        self._added = defaultdict(set)
+        self._removed = defaultdict(set)
+        self._changes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """
+        Строит граф из итерируемых пар (user1_id, user2_id) за один проход:
+        пары складываются в плоские массивы, затем по ним считаются степени
+        и заполняются соседи. Граф строится по одному снимку данных, поэтому
+        размер offsets и соседи всегда согласованы.
+        """
+        sources, targets = array('q'), array('q')
+        for user1_id, user2_id in pairs:
+            sources.append(user1_id)
+            targets.append(user2_id)
+        max_user_id = max(max(sources, default=0), max(targets, default=0))
+        degrees = array('q', bytes(8 * (max_user_id + 2)))
+        for user1_id, user2_id in zip(sources, targets):
+            degrees[user1_id + 1] += 1
+            degrees[user2_id + 1] += 1
+        offsets = degrees
+        for user_id in range(1, len(offsets)):
+            offsets[user_id] += offsets[user_id - 1]
+        neighbors = array('q', bytes(8 * offsets[-1]))
+        cursor = array('q', offsets[:-1])
+        for user1_id, user2_id in zip(sources, targets):
+            neighbors[cursor[user1_id]] = user2_id
+            cursor[user1_id] += 1
+            neighbors[cursor[user2_id]] = user1_id
+            cursor[user2_id] += 1
+        del sources, targets, cursor
+        for user_id in range(len(offsets) - 1):
+            start, end = offsets[user_id], offsets[user_id + 1]
+            if end - start > 1:
+                neighbors[start:end] = array('q', sorted(neighbors[start:end]))
+        return cls(offsets, neighbors)
+
+    @classmethod
+    def from_database(cls):
+        """Граф по одному запросу к таблице дружб, то есть по одному снимку базы."""
+        return cls.from_pairs(Friendship.objects.order_by().values_list(
+            'user1_id', 'user2_id').iterator(chunk_size=CHUNK_SIZE))
+
+    @property
+    def changes(self):
+        return self._changes
+
+    def _base(self, user_id):
+        if user_id + 1 >= len(self.offsets):
+            return ()
+        return self.neighbors_array[self.offsets[user_id]:self.offsets[user_id + 1]]
+
+    def friends(self, user_id):
+        """Множество id друзей пользователя с учётом изменений после построения."""
+        friends = set(self._base(user_id))
+        with self._lock:
+            friends -= self._removed.get(user_id, set())
+            friends |= self._added.get(user_id, set())
+        return friends
+
+    def add(self, user_id, other_id):
+        with self._lock:
+            for a, b in ((user_id, other_id), (other_id, user_id)):
+                self._removed[a].discard(b)
+                self._added[a].add(b)
+            self._changes += 1
+
+    def remove(self, user_id, other_id):
+        with self._lock:
+            for a, b in ((user_id, other_id), (other_id, user_id)):
+                self._added[a].discard(b)
+                self._removed[a].add(b)
+            self._changes += 1
+
+    def mutual(self, user_id, other_id):
+        """Отсортированный список общих друзей двух пользователей."""
+        return sorted(self.friends(user_id) & self.friends(other_id))
+
+    def suggestions(self, user_id, limit):
+        """
+        Возможные друзья: друзья друзей, которые ещё не друзья пользователю,
+        в порядке убывания числа общих друзей. Возвращает пары (id, число).
+        """
+        friends = self.friends(user_id)
+        counts = Counter()
+        for friend_id in friends:
+            counts.update(self.friends(friend_id))
+        for user in friends | {user_id}:
+            counts.pop(user, None)
+        return heapq.nsmallest(
+            limit, counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+class FriendGraphHolder:
+    """
+    Лениво строит индекс и перестраивает его, когда он устарел. Первое
+    построение идёт в запросе: отдавать ещё нечего. Устаревший индекс
+    перестраивается в фоновом потоке, а запросы до замены получают старый
+    индекс вместе с накопленными изменениями. Изменения, пришедшие во
+    время перестроения, применяются и к новому индексу.
+    """
+
+    def __init__(self):
+        self._graph = None
+        self._lock = threading.Lock()
+        # Изменения во время фонового перестроения; None - перестроения нет.
+        self._pending = None
+
+    def _is_fresh(self, graph):
+        return (
+            time.monotonic() - graph.built_at < settings.FRIEND_GRAPH_MAX_AGE
+            and graph.changes < settings.FRIEND_GRAPH_MAX_CHANGES
+        )
+
+    def get(self):
+        graph = self._graph
+        if graph is None:
+            with self._lock:
+                if self._graph is None:
+                    self._graph = FriendGraph.from_database()
+                return self._graph
+        if not self._is_fresh(graph):
+            self._start_rebuild()
+        return graph
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = []
+        threading.Thread(target=self._rebuild, name='friend-graph', daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            graph = FriendGraph.from_database()
+        except Exception:
+            logger.exception('Failed to rebuild the friend graph')
+            with self._lock:
+                self._pending = None
+            return
+        finally:
+            connections.close_all()
+        with self._lock:
+            for method, user_id, other_id in self._pending:
+                getattr(graph, method)(user_id, other_id)
+            self._graph = graph
+            self._pending = None
+
+    def reset(self):
+        with self._lock:
+            self._graph = None
+
+    def on_friendship_created(self, user, other):
+        self._after_commit('add', user, other)
+
+    def on_friendship_deleted(self, user, other):
+        self._after_commit('remove', user, other)
+
+    def _after_commit(self, method, user, other):
+        user_id, other_id = getattr(user, 'pk', user), getattr(other, 'pk', other)
+
+        def apply():
+            with self._lock:
+                graph = self._graph
+                if self._pending is not None:
+                    self._pending.append((method, user_id, other_id))
+            if graph is not None:
+                getattr(graph, method)(user_id, other_id)
+        transaction.on_commit(apply)
+
+
+friend_graph = FriendGraphHolder()
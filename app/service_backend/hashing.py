@@ -0,0 +1,36 @@
+"""
+Хэширование паролей с настраиваемой стоимостью.
+
+Хэши считаются в ограниченном пуле потоков. Поток запроса ждёт результат,
+поэтому пул не освобождает потоки воркера, а только ограничивает число
+одновременных хэширований (PASSWORD_HASH_WORKERS): при всплеске
+регистраций PBKDF2 занимает не больше этого числа ядер, и остальные
+запросы не остаются без процессора. hashlib отпускает GIL на время
+PBKDF2, поэтому потоки пула работают на разных ядрах.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix='password-hash',
+)
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 с числом итераций из PASSWORD_HASH_ITERATIONS. Алгоритм тот же,
+    что у стандартного хэшера, поэтому старые хэши остаются валидными и
+    пересчитываются при входе, если число итераций изменилось.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+
+def hash_password(raw_password):
+    return _executor.submit(make_password, raw_password).result()
+
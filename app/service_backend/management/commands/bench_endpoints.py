@@ -0,0 +1,298 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from service_backend.benchmarks import (
+    bench_database, percentile, seed_applications, seed_celebrities,
+    seed_friendships, seed_users
+)
+from service_backend.cache import friendship_cache
+from service_backend.hashing import hash_password
+from service_backend.models import Application, Friendship, User
+
+BUDGETS_PATH = Path(__file__).resolve().parents[2] / 'endpoint_budgets.json'
+
+SEED_DEFAULTS = {
+    'users': 10000,
+    'friendships': 50000,
+    'applications': 10000,
+    'celebrities': 3,
+    'fans': 2000,
+    'pending': 20,
+}
+
+LOGIN_PASSWORD = 'bench-password-12345'
+
+
+def endpoints(targets):
+    """
+    (имя, метод, путь, тело) для каждого маршрута service_backend/urls.py.
+    targets - имена пользователей, связанных с тем, от чьего имени идёт запрос.
+    """
+    friend, stranger, applicants = (
+        targets['friend'], targets['stranger'], targets['applicants'])
+    routes = [
+        ('user.create', 'post', '/api/new_user/',
+         {'username': 'bench-signup', 'password': LOGIN_PASSWORD}),
+        ('token.obtain', 'post', '/api/token/',
+         {'username': 'bench-login', 'password': LOGIN_PASSWORD}),
+        ('application.send', 'post', '/api/application/send/',
+         {'applicant': stranger}),
+        ('application.send_bulk', 'post', '/api/application/send/bulk/',
+         {'applicants': [stranger, friend, *applicants]}),
+        ('application.incoming', 'get', '/api/application/incoming/', None),
+        ('application.outgoing', 'get', '/api/application/outgoing/', None),
+        ('application.accept', 'put', f'/api/application/{applicants[0]}/',
+         {'accept': True}),
+        ('application.accept_bulk', 'put', '/api/application/accept/bulk/',
+         {'decisions': [{'username': username, 'accept': i % 2 == 0}
+                        for i, username in enumerate(applicants)]}),
+        ('friend.list', 'get', '/api/friend/', None),
+        ('friend.delete', 'put', f'/api/friend/{friend}/', None),
+        ('status.retrieve', 'get', f'/api/status/{friend}/', None),
+        ('status.batch', 'post', '/api/status/',
+         {'usernames': [friend, stranger, *applicants]}),
+        ('counts', 'get', '/api/counts/', None),
+        ('graph.mutual', 'get', f'/api/mutual/{friend}/', None),
+        ('graph.suggestions', 'get', '/api/suggestions/', None),
+        ('export.friendships', 'get', '/api/export/', None),
+        ('async.application.send', 'post', '/api/async/application/send/',
+         {'applicant': stranger}),
+        ('async.application.incoming', 'get', '/api/async/application/incoming/', None),
+        ('async.application.outgoing', 'get', '/api/async/application/outgoing/', None),
+        ('async.friend.list', 'get', '/api/async/friend/', None),
+        ('async.status.retrieve', 'get', f'/api/async/status/{friend}/', None),
+        ('metrics', 'get', '/metrics', None),
+    ]
+    if settings.AUTH_JWT:
+        routes += [
+            ('jwt.create', 'post', '/api/jwt/create/',
+             {'username': 'bench-login', 'password': LOGIN_PASSWORD}),
+            ('jwt.refresh', 'post', '/api/jwt/refresh/', {'refresh': targets['refresh']}),
+            ('jwt.revoke', 'post', '/api/jwt/revoke/', {'refresh': targets['refresh']}),
+        ]
+    return routes
+
+
+def calibrate(rounds=5, queries=200):
+    """
+    Время эталонной нагрузки на этой машине в мс (медиана из rounds):
+    queries запросов ORM по первичному ключу. Бюджеты времени записываются
+    вместе с ним и при проверке масштабируются на отношение замеров.
+    """
+    user_id = User.objects.values_list('id', flat=True).first()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(queries):
+            list(User.objects.filter(pk=user_id).values('id', 'username'))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def count_queries(captured):
+    # SAVEPOINT/RELEASE вложенной транзакции бенчмарка не считаются.
+    return sum(
+        1 for query in captured.captured_queries
+        if not query['sql'].upper().startswith(('SAVEPOINT', 'RELEASE SAVEPOINT',
+                                                'ROLLBACK TO SAVEPOINT'))
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет каждый маршрут API через тестовый клиент на синтетическом '
+        'графе (с "знаменитостями") и сверяет с бюджетами из endpoint_budgets.json '
+        'число SQL-запросов с холодным и прогретым кэшем связей, p95 времени '
+        'ответа и пик выделенной памяти. Превышение числа запросов завершает '
+        'команду с ошибкой. Бюджеты времени масштабируются по калибровочному '
+        'замеру этой машины, их превышение, как и превышение памяти, только '
+        'выводится (с --strict - тоже ошибка).'
+    )
+
+    def add_arguments(self, parser):
+        for name in SEED_DEFAULTS:
+            parser.add_argument(f'--{name}', type=int)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--budgets', default=str(BUDGETS_PATH))
+        parser.add_argument(
+            '--write-budgets', action='store_true',
+            help='Записать текущие значения как бюджеты вместо проверки.')
+        parser.add_argument(
+            '--headroom', type=float, default=3.0,
+            help='Запас для бюджетов времени и памяти при --write-budgets.')
+        parser.add_argument('--keepdb', action='store_true')
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Считать ошибкой и превышение бюджетов времени и памяти.')
+
+    def handle(self, *args, **options):
+        budgets_path = Path(options['budgets'])
+        budgets = json.loads(budgets_path.read_text()) if budgets_path.exists() else {}
+        seed = {
+            name: options[name] if options[name] is not None
+            else budgets.get('seed', {}).get(name, default)
+            for name, default in SEED_DEFAULTS.items()
+        }
+        with bench_database(keep=options['keepdb']):
+            self.stdout.write(f'Seeding {seed}...')
+            personas = self._seed(seed)
+            calibration_ms = calibrate()
+            results = {}
+            for persona, (user, targets) in personas.items():
+                client = APIClient(SERVER_NAME='localhost')
+                client.credentials(
+                    HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+                for name, method, path, data in endpoints(targets):
+                    results[f'{name}[{persona}]'] = self._measure(
+                        client, method, path, data, options['repeat'])
+
+        if options['write_budgets']:
+            self._write_budgets(
+                budgets_path, seed, calibration_ms, results, options['headroom'])
+            return
+        scale = calibration_ms / budgets.get('calibration_ms', calibration_ms)
+        self.stdout.write(
+            f'Calibration: {calibration_ms:.1f}ms, time budgets scaled by {scale:.2f}.')
+        failures = self._check(
+            results, budgets.get('endpoints', {}), scale, options['strict'])
+        if failures:
+            raise CommandError(f'{failures} endpoint(s) over budget.')
+
+    def _seed(self, seed):
+        user_ids = seed_users(seed['users'])
+        pairs = seed_friendships(user_ids, seed['friendships'])
+        pairs |= seed_celebrities(user_ids, seed['celebrities'], seed['fans'])
+        seed_applications(user_ids, seed['applications'], exclude=pairs)
+
+        login = User.objects.create(
+            username='bench-login', password=hash_password(LOGIN_PASSWORD))
+        stranger = User.objects.create(username='bench-stranger', password='!')
+        personas = {'user': user_ids[-1], 'celebrity': user_ids[0]}
+        result = {}
+        for persona, user_id in personas.items():
+            user = User.objects.get(id=user_id)
+            if not Friendship.objects.of(user).exists():
+                Friendship.objects.create(user1_id=user_ids[-2], user2=user)
+            senders = User.objects.exclude(id__in=[user.id, login.id, stranger.id]).exclude(
+                id__in=Friendship.objects.friends_of(user).values('friend_id')).exclude(
+                id__in=Application.objects.filter(user=user).values('applicant_id')).exclude(
+                id__in=Application.objects.filter(applicant=user).values('user_id'),
+            ).order_by('id')[:seed['pending']]
+            Application.objects.bulk_create(
+                Application(user=sender, applicant=user) for sender in senders)
+            targets = {
+                'friend': Friendship.objects.friends_of(user).order_by('id')[0]['friend_username'],
+                'stranger': stranger.username,
+                'applicants': list(Application.objects.filter(applicant=user).order_by(
+                    'id').values_list('user__username', flat=True)[:seed['pending']]),
+            }
+            if settings.AUTH_JWT:
+                targets['refresh'] = str(RefreshToken.for_user(user))
+            result[persona] = (user, targets)
+        return result
+
+    @staticmethod
+    def _request(client, method, path, data):
+        """
+        Выполняет изменяющий запрос в транзакции, которая затем откатывается,
+        чтобы каждый повтор видел одно и то же состояние. GET-запросы идут
+        как в работе, без транзакции.
+        """
+        if method == 'get':
+            response = client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        else:
+            with transaction.atomic():
+                response = getattr(client, method)(path, data, format='json')
+                transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise CommandError(f'{method.upper()} {path} -> {response.status_code}')
+        return response
+
+    def _measure(self, client, method, path, data, repeat):
+        # Холодный кэш: связи пользователей ещё не загружены.
+        caches[settings.FRIENDSHIP_CACHE_ALIAS].clear()
+        with CaptureQueriesContext(connection) as captured:
+            self._request(client, method, path, data)
+        cold_queries = count_queries(captured)
+        friendship_cache.wait_loads()
+        timings, queries = [], 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                self._request(client, method, path, data)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, count_queries(captured))
+        tracemalloc.start()
+        self._request(client, method, path, data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'cold_queries': cold_queries,
+            'queries': queries,
+            'p50_ms': statistics.median(timings),
+            'p95_ms': percentile(timings, 0.95),
+            'p99_ms': percentile(timings, 0.99),
+            'peak_kb': peak / 1024,
+        }
+
+    def _check(self, results, budgets, scale, strict):
+        failures = 0
+        for name, result in results.items():
+            budget = budgets.get(name)
+            errors, warnings = [], []
+            if budget is None:
+                errors.append('no budget')
+            else:
+                for field in ('cold_queries', 'queries'):
+                    if result[field] > budget[field]:
+                        errors.append(f'{field} {result[field]} > {budget[field]}')
+                p95_budget = budget['p95_ms'] * scale
+                if result['p95_ms'] > p95_budget:
+                    warnings.append(f'p95 {result["p95_ms"]:.1f}ms > {p95_budget:.1f}ms')
+                if result['peak_kb'] > budget['peak_kb']:
+                    warnings.append(f'memory {result["peak_kb"]:.0f}KB > {budget["peak_kb"]}KB')
+            if strict:
+                errors, warnings = errors + warnings, []
+            failures += bool(errors)
+            verdict = 'ok'
+            if errors or warnings:
+                verdict = ', '.join(
+                    [f'FAIL: {problem}' for problem in errors]
+                    + [f'WARN: {problem}' for problem in warnings])
+            self.stdout.write(
+                f'{name:45} q={result["cold_queries"]}/{result["queries"]:<3} '
+                f'p50={result["p50_ms"]:7.2f}ms p95={result["p95_ms"]:7.2f}ms '
+                f'p99={result["p99_ms"]:7.2f}ms mem={result["peak_kb"]:7.0f}KB  '
+                + verdict)
+        return failures
+
+    def _write_budgets(self, path, seed, calibration_ms, results, headroom):
+        budgets = {
+            'seed': seed,
+            'calibration_ms': round(calibration_ms, 1),
+            'endpoints': {
+                name: {
+                    'cold_queries': result['cold_queries'],
+                    'queries': result['queries'],
+                    'p95_ms': round(max(result['p95_ms'] * headroom, 5), 1),
+                    'peak_kb': round(max(result['peak_kb'] * headroom, 64)),
+                }
+                for name, result in sorted(results.items())
+            },
+        }
+        path.write_text(json.dumps(budgets, indent=2) + '\n')
+        self.stdout.write(f'Budgets written to {path}.')
@@ -0,0 +1,49 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from service_backend.benchmarks import (
+    bench_database, measure, seed_friendships, seed_users, summary
+)
+from service_backend.models import Friendship
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск дружбы через OR-запрос и через одну проверку '
+        'канонической пары. Для замера на 10M строк: --rows 10000000.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--lookups', type=int, default=2000)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        with bench_database(keep=options['keepdb']):
+            self.stdout.write('Seeding...')
+            user_ids = seed_users(options['users'])
+            pairs = list(seed_friendships(user_ids, options['rows']))
+            rng = random.Random(1)
+            probes = [
+                tuple(rng.sample(pair, 2)) if rng.random() < 0.5
+                else tuple(rng.sample(user_ids, 2))
+                for pair in rng.sample(pairs, min(options['lookups'], len(pairs)))
+            ]
+            probe = iter(probes * 2)
+
+            def legacy():
+                a, b = next(probe)
+                Friendship.objects.filter(
+                    Q(user1=a, user2=b) | Q(user1=b, user2=a)).exists()
+
+            def canonical():
+                a, b = next(probe)
+                Friendship.objects.between(a, b).exists()
+
+            self.stdout.write(
+                f'OR lookup:        {summary(measure(legacy, len(probes)))}')
+            self.stdout.write(
+                f'canonical lookup: {summary(measure(canonical, len(probes)))}')
@@ -0,0 +1,47 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from service_backend.benchmarks import measure, summary
+from service_backend.graph import FriendGraph
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит индекс графа дружбы на синтетическом графе в памяти и '
+        'замеряет поиск общих друзей и рекомендаций.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--degree', type=int, default=10,
+                            help='Среднее число друзей у пользователя.')
+        parser.add_argument('--lookups', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = options['users']
+        edges = users * options['degree'] // 2
+
+        def pairs():
+            rng = random.Random(0)
+            for _ in range(edges):
+                user_id, other_id = rng.randrange(1, users + 1), rng.randrange(1, users + 1)
+                if user_id != other_id:
+                    yield min(user_id, other_id), max(user_id, other_id)
+
+        started = time.perf_counter()
+        graph = FriendGraph.from_pairs(pairs())
+        self.stdout.write(
+            f'build: {users} users, {edges} edges in '
+            f'{time.perf_counter() - started:.1f}s')
+
+        rng = random.Random(1)
+        probes = iter([
+            (rng.randrange(1, users + 1), rng.randrange(1, users + 1))
+            for _ in range(options['lookups'] * 2)
+        ])
+        self.stdout.write('mutual:      ' + summary(measure(
+            lambda: graph.mutual(*next(probes)), options['lookups'])))
+        self.stdout.write('suggestions: ' + summary(measure(
+            lambda: graph.suggestions(next(probes)[0], 20), options['lookups'])))
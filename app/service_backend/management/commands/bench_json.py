@@ -0,0 +1,60 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from service_backend.renderers import FastJSONParser, FastJSONRenderer, orjson
+from service_backend.serializers import ApplicationSerializer, FollowSerializer
+
+
+def listings(items):
+    """Страницы друзей и заявок из items элементов, как их отдают эндпойнты."""
+    now = timezone.now()
+    friends = FollowSerializer(
+        [{'friend_username': f'user{i}'} for i in range(items)], many=True).data
+    applications = ApplicationSerializer([
+        {'id': i, 'user': {'username': f'user{i}'},
+         'applicant': {'username': 'celebrity'}, 'created_at': now}
+        for i in range(items)
+    ], many=True).data
+    return {
+        'friends': {'next': None, 'previous': None, 'results': friends},
+        'applications': {'next': None, 'previous': None, 'results': applications},
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость стандартных JSONRenderer/JSONParser DRF и '
+        'FastJSONRenderer/FastJSONParser (orjson) в байтах в секунду на '
+        'страницах друзей и заявок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def _rate(self, func, size, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return size * repeat / (time.perf_counter() - started) / 1e6
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write(f'orjson: {"installed" if orjson else "not installed"}')
+        for name, data in listings(options['items']).items():
+            body = JSONRenderer().render(data)
+            for label, renderer, parser in (
+                ('stdlib', JSONRenderer(), JSONParser()),
+                ('fast', FastJSONRenderer(), FastJSONParser()),
+            ):
+                render = self._rate(lambda: renderer.render(data), len(body), repeat)
+                parse = self._rate(
+                    lambda: parser.parse(io.BytesIO(body)), len(body), repeat)
+                self.stdout.write(
+                    f'{name} ({len(body)} bytes) {label}: '
+                    f'render {render:.1f} MB/s, parse {parse:.1f} MB/s')
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from service_backend.models import Application, User
+from service_backend.serializers import ApplicationSerializer, FollowSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ApplicationSerializer/FollowSerializer(many=True) с быстрым '
+        'путём represent_rows по строкам values() на списках из --rows элементов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def _time(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - started) / repeat * 1000, result
+
+    def handle(self, *args, **options):
+        count, repeat = options['rows'], options['repeat']
+        now = timezone.now()
+        applicant = User(id=0, username='celebrity')
+        applications = [
+            Application(id=i, user=User(id=i, username=f'user{i}'),
+                        applicant=applicant, created_at=now)
+            for i in range(count)
+        ]
+        application_rows = [
+            {'id': i, 'created_at': now, 'user__username': f'user{i}',
+             'applicant__username': 'celebrity'}
+            for i in range(count)
+        ]
+        friend_rows = [
+            {'id': i, 'friend_id': i, 'friend_username': f'user{i}'} for i in range(count)
+        ]
+        for name, slow, fast in (
+            ('applications',
+             lambda: ApplicationSerializer(applications, many=True).data,
+             lambda: ApplicationSerializer.represent_rows(application_rows)),
+            ('friends',
+             lambda: FollowSerializer(friend_rows, many=True).data,
+             lambda: FollowSerializer.represent_rows(friend_rows)),
+        ):
+            slow_ms, expected = self._time(slow, repeat)
+            fast_ms, result = self._time(fast, repeat)
+            if [dict(item) for item in expected] != result:
+                raise AssertionError(f'{name}: represent_rows output differs')
+            self.stdout.write(
+                f'{name} ({count} rows): serializer {slow_ms:.1f}ms, '
+                f'represent_rows {fast_ms:.1f}ms ({slow_ms / fast_ms:.1f}x)')
@@ -0,0 +1,84 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from service_backend.benchmarks import http_load, summary
+
+MODES = {
+    'runserver': ['runserver', '--noreload', '127.0.0.1:{port}'],
+    'gunicorn': ['serve', '--bind', '127.0.0.1:{port}'],
+    'gunicorn-asgi': ['serve', '--asgi', '--bind', '127.0.0.1:{port}'],
+}
+
+
+def wait_for_port(port, server, timeout=30):
+    """Ждёт, пока сервер начнёт принимать соединения; False, если он завершился или не успел."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Поочерёдно запускает сервис через runserver и gunicorn (WSGI и ASGI) '
+        'на одной машине и сравнивает пропускную способность на одном пути. '
+        'Без REDIS_URL gunicorn запускается с одним воркером: несколько '
+        'воркеров с кэшем в памяти процесса не проходят проверки serve.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', required=True)
+        parser.add_argument('--path', required=True)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--mode', action='append', choices=MODES)
+
+    def handle(self, *args, **options):
+        port = options['port']
+        manage = os.path.join(settings.BASE_DIR, 'manage.py')
+        if not settings.REDIS_URL:
+            self.stdout.write('REDIS_URL is not set: gunicorn runs a single worker.')
+        for mode in options['mode'] or MODES:
+            command = [arg.format(port=port) for arg in MODES[mode]]
+            if command[0] == 'serve' and not settings.REDIS_URL:
+                command += ['--workers', '1']
+            # stderr пишется в файл, а не в PIPE: сервер не заблокируется
+            # на заполненном канале, пока идёт нагрузка.
+            errors_file = tempfile.TemporaryFile()
+            server = subprocess.Popen(
+                [sys.executable, manage, *command],
+                stdout=subprocess.DEVNULL, stderr=errors_file,
+            )
+            try:
+                if not wait_for_port(port, server):
+                    server.terminate()
+                    server.wait()
+                    errors_file.seek(0)
+                    raise CommandError(
+                        f'{mode}: server did not start on port {port}.\n'
+                        + errors_file.read().decode(errors='replace'))
+                http_load(f'http://127.0.0.1:{port}', options['path'],
+                          options['token'], options['concurrency'], 100)
+                rps, timings, errors = http_load(
+                    f'http://127.0.0.1:{port}', options['path'], options['token'],
+                    options['concurrency'], options['requests'],
+                )
+            finally:
+                server.terminate()
+                server.wait()
+                errors_file.close()
+            self.stdout.write(
+                f'{mode}: {rps:.0f} req/s, errors={errors}, '
+                f'{summary(timings) if timings else "no successful requests"}'
+            )
@@ -0,0 +1,52 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from service_backend.benchmarks import bench_database
+from service_backend.models import User
+from service_backend.serializers import NewUserSerializer
+
+
+def legacy_signup(username, password):
+    user = User.objects.create(username=username)
+    user.set_password(password)
+    user.save()
+
+
+def signup(username, password):
+    serializer = NewUserSerializer(data={'username': username, 'password': password})
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет число регистраций в секунду на ядро через NewUserSerializer '
+        'в сравнении с прежним путём create + set_password + save.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+
+    def _run(self, func, prefix, total, threads):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(
+                lambda i: func(f'{prefix}{i}', 'password12345'), range(total)))
+        return total / (time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        self.stdout.write(
+            f'hasher={settings.PASSWORD_HASHERS[0]} '
+            f'iterations={settings.PASSWORD_HASH_ITERATIONS} cores={cores}')
+        with bench_database():
+            for name, func in (('legacy', legacy_signup), ('single insert', signup)):
+                rate = self._run(func, name.replace(' ', '_'),
+                                 options['signups'], options['threads'])
+                self.stdout.write(
+                    f'{name}: {rate:.1f} signups/s, {rate / cores:.1f} signups/s per core')
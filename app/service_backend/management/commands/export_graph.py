@@ -0,0 +1,46 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from service_backend import export
+from service_backend.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая выгрузка дружб или заявок (всего графа или одного '
+        'пользователя) в NDJSON или CSV. Файл с расширением .gz сжимается '
+        'gzip. Формат совместим с import_graph.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(export.KINDS))
+        parser.add_argument('--format', choices=list(export.FORMATS), default='ndjson')
+        parser.add_argument('--user', help='username: выгрузить только его связи.')
+        parser.add_argument(
+            '--output', default='-', help='Путь к файлу или "-" для stdout.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User {options["user"]} does not exist.')
+        chunks = export.stream(options['kind'], options['format'], user)
+        output = options['output']
+        if output.endswith('.gz'):
+            chunks = export.gzipped(chunks)
+        started = time.perf_counter()
+        written = 0
+        target = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+        self.stderr.write(
+            f'{options["kind"]}: {written} bytes in '
+            f'{time.perf_counter() - started:.1f}s')
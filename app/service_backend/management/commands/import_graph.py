@@ -0,0 +1,261 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import time
+
+from django.contrib.auth.hashers import (
+    UNUSABLE_PASSWORD_PREFIX, identify_hasher, make_password
+)
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from service_backend.models import Application, Friendship, User
+
+
+def read_rows(path):
+    """
+    Построчно читает JSONL или CSV (с заголовком), в том числе .gz,
+    и отдаёт словари, не загружая файл в память целиком.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as source:
+        if name.endswith('.csv'):
+            yield from csv.DictReader(source)
+        elif name.endswith(('.jsonl', '.ndjson')):
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise CommandError(f'Unsupported file format: {path}')
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая загрузка пользователей, заявок и дружб из JSONL/CSV '
+        '(поля: username, password | user1, user2 | user, applicant, created_at; '
+        'пользователи указываются по username). Пары дружбы приводятся к '
+        'каноническому виду, дубликаты и уже существующие строки пропускаются, '
+        'как и заявки между друзьями и встречные заявки. Поле password - '
+        'готовый хэш из PASSWORD_HASHERS, необязательное created_at заявки - '
+        'время в ISO 8601, как в выгрузке (без него - время загрузки). '
+        'Кэши связей и индекс графа подхватят данные по истечении своего TTL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users')
+        parser.add_argument('--friendships')
+        parser.add_argument('--applications')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--password',
+            help='Общий пароль для пользователей без поля password; '
+                 'хэшируется один раз. Без него такие пользователи получают '
+                 'неиспользуемый пароль.',
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загружать через COPY (только PostgreSQL).',
+        )
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy is supported only on PostgreSQL.')
+        self.batch_size = options['batch_size']
+        self.use_copy = options['copy']
+        self.shared_hash = make_password(options['password'])
+        for kind in ('users', 'friendships', 'applications'):
+            if options[kind]:
+                self._import(kind, options[kind])
+        # Пакетная загрузка не обновляет счётчики связей пользователей.
+        if options['friendships'] or options['applications']:
+            call_command('repair_counters', stdout=self.stdout)
+
+    def _import(self, kind, path):
+        load = getattr(self, f'_copy_{kind}' if self.use_copy else f'_load_{kind}')
+        started = time.perf_counter()
+        total = 0
+        for batch in batches(read_rows(path), self.batch_size):
+            with transaction.atomic():
+                load(batch)
+            total += len(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{kind}: {total} rows in {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:.0f} rows/s)')
+
+    def _password(self, row):
+        """
+        Поле password должно быть готовым хэшем одного из PASSWORD_HASHERS
+        (или неиспользуемым паролем, начинающимся с "!"): пароль открытым
+        текстом записался бы в базу как есть, и войти с ним было бы нельзя.
+        """
+        password = row.get('password')
+        if not password:
+            return self.shared_hash
+        if not password.startswith(UNUSABLE_PASSWORD_PREFIX):
+            try:
+                identify_hasher(password)
+            except ValueError:
+                raise CommandError(
+                    f'User {row["username"]}: password is not a hash produced by '
+                    f'PASSWORD_HASHERS. Hash it before import or leave it empty.')
+        return password
+
+    @staticmethod
+    def _created_at(row):
+        """Время заявки из поля created_at (ISO 8601, как в выгрузке) или None."""
+        value = row.get('created_at')
+        if not value:
+            return None
+        try:
+            created_at = parse_datetime(value)
+        except ValueError:
+            created_at = None
+        if created_at is None:
+            raise CommandError(f'Application {row["user"]} -> {row["applicant"]}: '
+                               f'invalid created_at {value!r}.')
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+        return created_at
+
+    @staticmethod
+    def _user_ids(usernames):
+        return dict(User.objects.filter(
+            username__in=set(usernames)).values_list('username', 'id').order_by())
+
+    def _pairs(self, batch, first, second):
+        """(строка, id, id) для строк, где оба пользователя есть и различны."""
+        user_ids = self._user_ids(
+            itertools.chain.from_iterable((row[first], row[second]) for row in batch))
+        for row in batch:
+            user_id, other_id = user_ids.get(row[first]), user_ids.get(row[second])
+            if user_id is not None and other_id is not None and user_id != other_id:
+                yield row, user_id, other_id
+
+    def _load_users(self, batch):
+        User.objects.bulk_create(
+            [User(username=row['username'], password=self._password(row)) for row in batch],
+            ignore_conflicts=True,
+        )
+
+    def _load_friendships(self, batch):
+        pairs = {
+            Friendship.canonical(user_id, other_id)
+            for _, user_id, other_id in self._pairs(batch, 'user1', 'user2')
+        }
+        Friendship.objects.bulk_create(
+            [Friendship(user1_id=user1_id, user2_id=user2_id) for user1_id, user2_id in pairs],
+            ignore_conflicts=True,
+        )
+
+    def _load_applications(self, batch):
+        """
+        Пропускает заявки, которых не создали бы эндпойнты: между друзьями
+        и встречные к уже существующим. Из встречной пары внутри пачки
+        остаётся заявка от пользователя с меньшим id.
+        """
+        created_at = {
+            (user_id, applicant_id): self._created_at(row)
+            for row, user_id, applicant_id in self._pairs(batch, 'user', 'applicant')
+        }
+        pairs = {
+            (user_id, applicant_id) for user_id, applicant_id in created_at
+            if not (user_id > applicant_id and (applicant_id, user_id) in created_at)
+        }
+        user_ids = {user_id for pair in pairs for user_id in pair}
+        friends = set(Friendship.objects.filter(
+            user1__in=user_ids, user2__in=user_ids,
+        ).values_list('user1_id', 'user2_id').order_by())
+        crossed = set(Application.objects.filter(
+            user__in={applicant_id for _, applicant_id in pairs},
+            applicant__in={user_id for user_id, _ in pairs},
+        ).values_list('applicant_id', 'user_id').order_by())
+        now = timezone.now()
+        Application.objects.bulk_create(
+            [Application(user_id=user_id, applicant_id=applicant_id,
+                         created_at=created_at[user_id, applicant_id] or now)
+             for user_id, applicant_id in pairs
+             if Friendship.canonical(user_id, applicant_id) not in friends
+             and (user_id, applicant_id) not in crossed],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def _copy(cursor, table, columns, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE IF NOT EXISTS {table} ({columns}) ON COMMIT DROP')
+        cursor.copy_expert(f'COPY {table} FROM STDIN WITH (FORMAT csv)', buffer)
+
+    def _copy_users(self, batch):
+        with connection.cursor() as cursor:
+            self._copy(cursor, 'import_users', 'username text, password text', (
+                (row['username'], self._password(row)) for row in batch))
+            cursor.execute(f'''
+                INSERT INTO {User._meta.db_table} (
+                    username, password, is_superuser, is_staff, is_active,
+                    first_name, last_name, email, date_joined,
+                    friend_count, incoming_count, outgoing_count
+                )
+                SELECT username, password, false, false, true, '', '', '', now(), 0, 0, 0
+                FROM import_users
+                ON CONFLICT (username) DO NOTHING
+            ''')
+
+    def _copy_pairs(self, batch, first, second, table, select, target, where='', extra=()):
+        """
+        Загружает пары через временную таблицу import_<table> с колонками
+        user_name, other_name и текстовыми колонками extra из полей строк
+        (пустое или отсутствующее поле - NULL).
+        """
+        columns = ''.join(f', {name} text' for name in extra)
+        with connection.cursor() as cursor:
+            self._copy(cursor, f'import_{table}', f'user_name text, other_name text{columns}', (
+                (row[first], row[second], *(row.get(name) or '' for name in extra))
+                for row in batch))
+            cursor.execute(f'''
+                INSERT INTO {table} ({target})
+                SELECT DISTINCT {select}
+                FROM import_{table} source
+                JOIN {User._meta.db_table} a ON a.username = source.user_name
+                JOIN {User._meta.db_table} b ON b.username = source.other_name
+                WHERE a.id <> b.id {where}
+                ON CONFLICT DO NOTHING
+            ''')
+
+    def _copy_friendships(self, batch):
+        self._copy_pairs(
+            batch, 'user1', 'user2', Friendship._meta.db_table,
+            'LEAST(a.id, b.id), GREATEST(a.id, b.id)', 'user1_id, user2_id')
+
+    def _copy_applications(self, batch):
+        # Те же правила, что в _load_applications.
+        friendships, applications = Friendship._meta.db_table, Application._meta.db_table
+        self._copy_pairs(
+            batch, 'user', 'applicant', applications,
+            'a.id, b.id, COALESCE(source.created_at::timestamptz, now())',
+            'user_id, applicant_id, created_at', f'''
+                AND NOT EXISTS (
+                    SELECT 1 FROM {friendships} f
+                    WHERE f.user1_id = LEAST(a.id, b.id) AND f.user2_id = GREATEST(a.id, b.id))
+                AND NOT EXISTS (
+                    SELECT 1 FROM {applications} r
+                    WHERE r.user_id = b.id AND r.applicant_id = a.id)
+                AND NOT (a.id > b.id AND EXISTS (
+                    SELECT 1 FROM import_{applications} r
+                    WHERE r.user_name = source.other_name AND r.other_name = source.user_name))
+            ''', extra=('created_at',))
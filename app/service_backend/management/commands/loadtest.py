@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from service_backend.benchmarks import http_load, summary
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест запущенного сервера: GET-запросы к каждому пути '
+        'с заданной параллельностью, вывод RPS и перцентилей задержки. '
+        'Чтобы сравнить WSGI и ASGI, запустите сервер в обоих режимах на '
+        'одной машине и передайте синхронный и асинхронный путь, например '
+        '--path /api/status/Test/ --path /api/async/status/Test/.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--token', required=True)
+        parser.add_argument('--path', action='append', required=True)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for path in options['path']:
+            rps, timings, errors = http_load(
+                options['base_url'], path, options['token'],
+                options['concurrency'], options['requests'],
+            )
+            self.stdout.write(
+                f'{path}: {rps:.0f} req/s, errors={errors}, '
+                f'{summary(timings) if timings else "no successful requests"}'
+            )
@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from service_backend.cache import friendship_cache
+from service_backend.models import Application, bump_counters, lock_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет заявки в друзья старше --ttl-days дней (по умолчанию '
+        'APPLICATION_TTL_DAYS) пачками по --batch-size в отдельных коротких '
+        'транзакциях. Можно запускать по расписанию при живом трафике.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-days', type=int, default=settings.APPLICATION_TTL_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Пауза между пачками в секундах, чтобы снизить нагрузку на базу.')
+
+    def _purge_batch(self, cutoff, batch_size):
+        """Удаляет одну пачку просроченных заявок, возвращает число удалённых."""
+        candidates = list(Application.objects.filter(
+            created_at__lt=cutoff).order_by('created_at', 'id').values_list(
+            'id', 'user_id', 'applicant_id')[:batch_size])
+        if not candidates:
+            return None
+        with transaction.atomic():
+            # Те же блокировки пользователей, что и у отправки и принятия
+            # заявок: строки не удаляются дважды, счётчики не расходятся.
+            lock_users(*{user_id for _, *pair in candidates for user_id in pair})
+            rows = list(Application.objects.filter(
+                id__in=[row[0] for row in candidates], created_at__lt=cutoff,
+            ).values_list('id', 'user_id', 'applicant_id').order_by())
+            if rows:
+                Application.objects.filter(id__in=[row[0] for row in rows]).delete()
+                bump_counters(
+                    *((user_id, 'outgoing_count', -1) for _, user_id, _ in rows),
+                    *((applicant_id, 'incoming_count', -1) for _, _, applicant_id in rows),
+                )
+                friendship_cache.invalidate(
+                    *{user_id for _, *pair in rows for user_id in pair})
+        return len(rows)
+
+    def handle(self, *args, **options):
+        if options['ttl_days'] <= 0:
+            self.stdout.write('Application expiry is disabled.')
+            return
+        cutoff = timezone.now() - timedelta(days=options['ttl_days'])
+        started = time.perf_counter()
+        deleted = batches = 0
+        while True:
+            count = self._purge_batch(cutoff, options['batch_size'])
+            if count is None:
+                break
+            deleted += count
+            batches += 1
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{deleted} applications older than {cutoff:%Y-%m-%d %H:%M} deleted '
+            f'in {batches} batches, {elapsed:.1f}s ({deleted / elapsed:.0f} rows/s).')
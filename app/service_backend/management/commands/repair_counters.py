@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, Q
+
+from service_backend.models import User, relation_counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики друзей, входящих и исходящих заявок по '
+        'таблицам связей и исправляет расхождения. Пользователи '
+        'обрабатываются диапазонами id по --batch-size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать пользователей с расхождениями.')
+
+    def handle(self, *args, **options):
+        counts = relation_counts()
+        drifted = Q()
+        for field in counts:
+            drifted |= ~Q(**{field: F(f'real_{field}')})
+        max_id = User.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        batch_size = options['batch_size']
+        checked = repaired = 0
+        for start in range(0, max_id + 1, batch_size):
+            users = User.objects.filter(id__gte=start, id__lt=start + batch_size)
+            with transaction.atomic():
+                ids = list(users.annotate(**{
+                    f'real_{field}': expression for field, expression in counts.items()
+                }).filter(drifted).values_list('id', flat=True).order_by())
+                if ids and not options['dry_run']:
+                    User.objects.filter(id__in=ids).update(**counts)
+            checked += users.count()
+            repaired += len(ids)
+        action = 'drifted' if options['dry_run'] else 'repaired'
+        self.stdout.write(f'{checked} users checked, {repaired} {action}.')
@@ -0,0 +1,40 @@
+import os
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from service_backend.checks import WORKERS_TAG
+
+CONFIG = os.path.join(settings.BASE_DIR, 'app', 'gunicorn.conf.py')
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает сервис через gunicorn с несколькими процессами. '
+        'Параметры по умолчанию берутся из app/gunicorn.conf.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind')
+        parser.add_argument('--workers', type=int)
+        parser.add_argument('--threads', type=int)
+        parser.add_argument('--asgi', action='store_true',
+                            help='Запустить app/asgi.py на uvicorn-воркерах.')
+
+    def handle(self, *args, **options):
+        env = os.environ.copy()
+        for option, variable in (
+            ('bind', 'WEB_BIND'), ('workers', 'WEB_WORKERS'), ('threads', 'WEB_THREADS'),
+        ):
+            if options[option] is not None:
+                env[variable] = str(options[option])
+        if options['asgi']:
+            env['WEB_ASGI'] = '1'
+        if options['workers'] is not None:
+            settings.WEB_WORKERS = options['workers']
+        self.check(tags=[WORKERS_TAG], include_deployment_checks=True)
+        os.chdir(settings.BASE_DIR)
+        os.execvpe(sys.executable, [
+            sys.executable, '-m', 'gunicorn', '--config', CONFIG,
+        ], env)
@@ -0,0 +1,277 @@
+"""
+Метрики запросов: время ответа, число SQL-запросов, время в базе и
+размер ответа для каждого маршрута из urls.py.
+
+MetricsMiddleware считает запросы к базе через connection.execute_wrapper
+и складывает значения в гистограммы, которые вместе со счётчиками попаданий
+и промахов кэша связей отдаются в текстовом формате Prometheus на /metrics
+(только с внутренних адресов или администраторам). Запросы к базе
+дольше METRICS_SLOW_QUERY_MS пишутся в лог service_backend.metrics,
+не больше METRICS_SLOW_QUERY_LOG_LIMIT самых медленных на запрос.
+
+Гистограммы хранятся в памяти процесса: при нескольких воркерах каждый
+отдаёт свою часть, поэтому Prometheus должен опрашивать воркеры по
+отдельности (или агрегировать по instance).
+"""
+import bisect
+import functools
+import ipaddress
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+from service_backend.cache import friendship_cache
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+LABELS = ('route', 'method', 'status')
+
+
+class Histogram:
+    """Гистограмма Prometheus с фиксированными границами и набором меток."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            counts, _, _ = series
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self._lock:
+            series = [(labels, list(counts), total, count)
+                      for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            label_text = ','.join(
+                f'{name}="{_escape(value)}"' for name, value in zip(LABELS, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса.', SECONDS_BUCKETS)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Число SQL-запросов за запрос.', QUERIES_BUCKETS)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Время SQL-запросов за запрос.', SECONDS_BUCKETS)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Размер тела ответа.', BYTES_BUCKETS)
+
+HISTOGRAMS = (REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_DURATION, RESPONSE_SIZE)
+
+
+def render_counter(name, documentation, value):
+    return f'# HELP {name} {documentation}\n# TYPE {name} counter\n{name} {value}'
+
+
+def render_cache_counters():
+    """Попадания и промахи кэша связей (FriendshipCache.stats)."""
+    stats = friendship_cache.stats()
+    return '\n'.join((
+        render_counter(
+            'friendship_cache_hits_total', 'Попадания в кэш связей.', stats['hits']),
+        render_counter(
+            'friendship_cache_misses_total', 'Промахи кэша связей.', stats['misses']),
+    ))
+
+
+class QueryRecorder:
+    """execute_wrapper, считающий запросы и их время за один HTTP-запрос."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if elapsed * 1000 >= settings.METRICS_SLOW_QUERY_MS:
+                self.slow.append((elapsed, sql))
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+def _log_slow_queries(route, recorder):
+    slowest = sorted(recorder.slow, key=lambda item: item[0], reverse=True)
+    for elapsed, sql in slowest[:settings.METRICS_SLOW_QUERY_LOG_LIMIT]:
+        logger.warning('Slow query on %s: %.1f ms: %s', route, elapsed * 1000, sql)
+
+
+_recorder = ContextVar('metrics_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    execute_wrapper, установленный на все соединения: передаёт запрос
+    QueryRecorder текущего HTTP-запроса. Recorder хранится в ContextVar,
+    поэтому находится и в потоках sync_to_async асинхронных представлений.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _install(connection):
+    if record_query not in connection.execute_wrappers:
+        # В начало списка: execute_wrapper() других кодов снимает последнюю обёртку.
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    _install(connection)
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики по маршрутам. Работает и в синхронном, и в асинхронном
+    стеке, поэтому под ASGI не добавляет переходов между потоками. Для
+    потоковых ответов время и запросы учитываются до начала отдачи тела,
+    размер - после его отдачи.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        # Соединения, открытые до загрузки модуля, получают обёртку здесь.
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        recorder = QueryRecorder()
+        return recorder, _recorder.set(recorder), time.perf_counter()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self._observe(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self._observe(request, response, recorder, started)
+
+    def _observe(self, request, response, recorder, started):
+        duration = time.perf_counter() - started
+        route = route_of(request)
+        labels = (route, request.method, str(response.status_code))
+        REQUEST_DURATION.observe(labels, duration)
+        REQUEST_QUERIES.observe(labels, recorder.count)
+        REQUEST_DB_DURATION.observe(labels, recorder.duration)
+        if response.streaming:
+            counted = self._acounted if response.is_async else self._counted
+            response.streaming_content = counted(response.streaming_content, labels)
+        else:
+            RESPONSE_SIZE.observe(labels, len(response.content))
+        if recorder.slow:
+            _log_slow_queries(route, recorder)
+        return response
+
+    @staticmethod
+    def _counted(chunks, labels):
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        RESPONSE_SIZE.observe(labels, size)
+
+    @staticmethod
+    async def _acounted(chunks, labels):
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        RESPONSE_SIZE.observe(labels, size)
+
+
+def metrics_allowed(request):
+    """
+    /metrics доступен с адресов из METRICS_ALLOWED_NETWORKS (по умолчанию
+    только localhost) и администраторам, вошедшим через сессию.
+    """
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        address = None
+    if address is not None and any(address in network for network in _allowed_networks()):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_active and user.is_staff
+
+
+@functools.lru_cache(maxsize=None)
+def _allowed_networks():
+    return tuple(ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        '\n'.join([*(histogram.render() for histogram in HISTOGRAMS), render_cache_counters()])
+        + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,35 @@
+from django.db import migrations
+from django.db.models import Exists, F, OuterRef
+
+
+def canonicalize_friendships(apps, schema_editor):
+    """
+    Приводит пары к виду user1_id < user2_id и удаляет дубликаты,
+    оставляя строку с наименьшим id.
+    """
+    Friendship = apps.get_model('service_backend', 'Friendship')
+    Friendship.objects.filter(user1=F('user2')).delete()
+    Friendship.objects.filter(user1__gt=F('user2')).filter(
+        Exists(Friendship.objects.filter(
+            user1=OuterRef('user2'), user2=OuterRef('user1'),
+        ))
+    ).delete()
+    Friendship.objects.filter(user1__gt=F('user2')).update(
+        user1=F('user2'), user2=F('user1'),
+    )
+    Friendship.objects.filter(
+        Exists(Friendship.objects.filter(
+            user1=OuterRef('user1'), user2=OuterRef('user2'), id__lt=OuterRef('id'),
+        ))
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("service_backend", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_friendships, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_backend', '0002_friendship_canonical_pairs'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.UniqueConstraint(fields=('user1', 'user2'), name='friendship_unique_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.CheckConstraint(check=models.Q(('user1__lt', models.F('user2'))), name='friendship_canonical_order'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+def dedupe_applications(apps, schema_editor):
+    """Удаляет повторные заявки, оставляя самую раннюю."""
+    Application = apps.get_model('service_backend', 'Application')
+    Application.objects.filter(
+        Exists(Application.objects.filter(
+            user=OuterRef('user'), applicant=OuterRef('applicant'), id__lt=OuterRef('id'),
+        ))
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("service_backend", "0003_friendship_constraints"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_applications, migrations.RunPython.noop),
+    ]
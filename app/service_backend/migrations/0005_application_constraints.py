@@ -0,0 +1,25 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_backend', '0004_application_dedupe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['applicant', '-id'], name='application_incoming_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['user', '-id'], name='application_outgoing_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='application',
+            constraint=models.UniqueConstraint(fields=('user', 'applicant'), name='application_unique_pair'),
+        ),
+    ]
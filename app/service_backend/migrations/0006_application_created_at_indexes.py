@@ -0,0 +1,29 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_backend', '0005_application_constraints'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='application',
+            name='application_incoming_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='application',
+            name='application_outgoing_idx',
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['applicant', '-created_at', '-id'], name='application_incoming_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='application_outgoing_idx'),
+        ),
+    ]
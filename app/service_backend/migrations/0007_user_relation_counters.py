@@ -0,0 +1,50 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счётчики по существующим дружбам и заявкам."""
+    User = apps.get_model('service_backend', 'User')
+    Friendship = apps.get_model('service_backend', 'Friendship')
+    Application = apps.get_model('service_backend', 'Application')
+
+    def count(model, field):
+        return Coalesce(Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field).annotate(count=Count('*')).values('count'),
+        ), 0)
+
+    User.objects.update(
+        friend_count=count(Friendship, 'user1') + count(Friendship, 'user2'),
+        incoming_count=count(Application, 'applicant'),
+        outgoing_count=count(Application, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_backend', '0006_application_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='friend_count',
+            field=models.IntegerField(default=0, verbose_name='Число друзей'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='incoming_count',
+            field=models.IntegerField(default=0, verbose_name='Входящие заявки'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='outgoing_count',
+            field=models.IntegerField(default=0, verbose_name='Исходящие заявки'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
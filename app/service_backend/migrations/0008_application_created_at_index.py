@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+from service_backend.operations import AddIndexConcurrentlyOnPostgres
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('service_backend', '0007_user_relation_counters'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='application',
+            index=models.Index(fields=['created_at', 'id'], name='application_created_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+from service_backend.operations import AddIndexConcurrentlyOnPostgres
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('service_backend', '0008_application_created_at_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='friendship',
+            index=models.Index(fields=['user1', '-id'], name='friendship_user1_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='friendship',
+            index=models.Index(fields=['user2', '-id'], name='friendship_user2_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.1 on 2026-10-18 13:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_backend', '0009_friendship_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='application',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Время получения'),
+        ),
+    ]
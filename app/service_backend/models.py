@@ -1,8 +1,21 @@
+from collections import Counter, defaultdict
+
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import AbstractUser
 
 
+class FriendshipStatus(models.TextChoices):
+    NOTHING = 'Нет ничего'
+    OUTGOING = 'Исходящая заявка'
+    INCOMING = 'Входящая заявка'
+    FRIENDS = 'Уже друзья'
+    YOURSELF = 'Это ты!'
+
+
 class User(AbstractUser):
     username = models.CharField(
         _('Имя пользователя'),
@@ -17,6 +30,12 @@ class User(AbstractUser):
         },
     )
 
+    # Денормализованные счётчики связей: меняются через bump_counters
+    # вместе с самими связями, пересчитываются командой repair_counters.
+    friend_count = models.IntegerField(verbose_name='Число друзей', default=0)
+    incoming_count = models.IntegerField(verbose_name='Входящие заявки', default=0)
+    outgoing_count = models.IntegerField(verbose_name='Исходящие заявки', default=0)
+
     class Meta:
         ordering = ['-id']
         verbose_name = 'Пользователь'
@@ -39,9 +58,11 @@ class Application(models.Model):
         verbose_name='Кандидат',
         related_name='applicant',
     )
+    # default, а не auto_now_add: import_graph сохраняет время из выгрузки.
     created_at = models.DateTimeField(
         verbose_name='Время получения',
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
     )
 
     def __str__(self):
@@ -51,9 +72,137 @@ class Application(models.Model):
         ordering = ['-id']
         verbose_name = 'Заявка в друзья'
         verbose_name_plural = 'Заявки в друзья'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'applicant'],
+                name='application_unique_pair',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['applicant', '-created_at', '-id'],
+                name='application_incoming_idx'),
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='application_outgoing_idx'),
+            # Для удаления просроченных заявок (purge_applications).
+            models.Index(
+                fields=['created_at', 'id'],
+                name='application_created_idx'),
+        ]
+
+
+def _pk(user):
+    return getattr(user, 'pk', user)
+
+
+def lock_users(*users):
+    """
+    Блокирует строки пользователей (SELECT ... FOR UPDATE) до конца текущей
+    транзакции. Изменения связей пары выполняются под этой блокировкой,
+    поэтому встречные запросы одной пары идут по очереди; строки берутся
+    в порядке id, чтобы не было взаимных блокировок.
+    """
+    return list(User.objects.select_for_update().filter(
+        id__in={_pk(user) for user in users}).order_by('id').values_list('id', flat=True))
+
+
+def bump_counters(*changes):
+    """
+    Изменяет счётчики пользователей одним UPDATE с F(), без чтения строк.
+    changes - тройки (пользователь, поле, приращение), повторы складываются:
+    bump_counters((user, 'outgoing_count', 1), (applicant, 'incoming_count', 1)).
+    """
+    totals = Counter()
+    for user, field, delta in changes:
+        totals[_pk(user), field] += delta
+    by_field = defaultdict(dict)
+    for (user_id, field), delta in totals.items():
+        if delta:
+            by_field[field][user_id] = delta
+    if not by_field:
+        return
+    User.objects.filter(
+        pk__in={user_id for deltas in by_field.values() for user_id in deltas},
+    ).update(**{
+        field: F(field) + Case(
+            *(When(pk=user_id, then=Value(delta)) for user_id, delta in deltas.items()),
+            default=Value(0),
+        )
+        for field, deltas in by_field.items()
+    })
+
+
+def _count(queryset, field):
+    """Подзапрос: число строк queryset, у которых field - внешний пользователь."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+            count=Count('*')).values('count'),
+    ), 0)
+
+
+def relation_counts():
+    """Выражения, вычисляющие счётчики пользователя по таблицам связей."""
+    return {
+        'friend_count': (
+            _count(Friendship.objects.all(), 'user1')
+            + _count(Friendship.objects.all(), 'user2')),
+        'incoming_count': _count(Application.objects.all(), 'applicant'),
+        'outgoing_count': _count(Application.objects.all(), 'user'),
+    }
+
+
+class FriendshipQuerySet(models.QuerySet):
+
+    def between(self, user, other):
+        """Пара хранится упорядоченной, поэтому достаточно одного поиска по индексу."""
+        user1_id, user2_id = Friendship.canonical(user, other)
+        return self.filter(user1_id=user1_id, user2_id=user2_id)
+
+    def of(self, user):
+        return self.filter(Q(user1=user) | Q(user2=user))
+
+    def friends_page(self, user, limit, before=None, after=None, descending=True):
+        """
+        Страница friends_of по id (по убыванию или возрастанию), не больше
+        limit строк, с id меньше before и больше after. Это UNION ALL двух
+        выборок, каждая из которых идёт по своему индексу (user1, -id) или
+        (user2, -id) и ограничена limit строками, поэтому запрос не
+        сортирует всех друзей пользователя.
+        """
+        ordering = '-id' if descending else 'id'
+        probes = []
+        for side, other in (('user1', 'user2'), ('user2', 'user1')):
+            ids = self.filter(**{side: user})
+            if before is not None:
+                ids = ids.filter(id__lt=before)
+            if after is not None:
+                ids = ids.filter(id__gt=after)
+            # Срез во вложенном запросе: части UNION не могут иметь свой LIMIT в SQLite.
+            ids = ids.order_by(ordering).values('id')[:limit]
+            probes.append(self.filter(id__in=ids).annotate(
+                friend_id=F(f'{other}_id'), friend_username=F(f'{other}__username'),
+            ).values('id', 'friend_id', 'friend_username').order_by())
+        return probes[0].union(probes[1], all=True).order_by(ordering)[:limit]
+
+    def friends_of(self, user):
+        """Дружбы пользователя с id и username второй стороны пары."""
+        return self.of(user).annotate(
+            friend_id=Case(
+                When(user1=user, then=F('user2_id')), default=F('user1_id'),
+            ),
+            friend_username=Case(
+                When(user1=user, then=F('user2__username')),
+                default=F('user1__username'),
+            ),
+        ).values('id', 'friend_id', 'friend_username')
 
 
 class Friendship(models.Model):
+    """
+    Дружеское отношение хранится одной строкой в каноническом порядке:
+    user1_id < user2_id.
+    """
     user1 = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -67,10 +216,41 @@ class Friendship(models.Model):
         related_name='friendship2',
     )
 
+
+    objects = FriendshipQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.user1} - {self.user2}'
 
+    @staticmethod
+    def canonical(user, other):
+        """Возвращает пару id пользователей в каноническом порядке."""
+        user_id, other_id = _pk(user), _pk(other)
+        if user_id > other_id:
+            return other_id, user_id
+        return user_id, other_id
+
+    def save(self, *args, **kwargs):
+        if self.user1_id > self.user2_id:
+            self.user1_id, self.user2_id = self.user2_id, self.user1_id
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-id']
         verbose_name = 'Дружеское отношение'
         verbose_name_plural = 'Дружеские отношения'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user1', 'user2'],
+                name='friendship_unique_pair',
+            ),
+            models.CheckConstraint(
+                check=Q(user1__lt=F('user2')),
+                name='friendship_canonical_order',
+            ),
+        ]
+        indexes = [
+            # Страницы друзей по id (friends_page).
+            models.Index(fields=['user1', '-id'], name='friendship_user1_idx'),
+            models.Index(fields=['user2', '-id'], name='friendship_user2_idx'),
+        ]
@@ -0,0 +1,29 @@
+"""Операции миграций, общие для нескольких миграций."""
+from django.db import migrations
+
+
+class AddIndexConcurrentlyOnPostgres(migrations.AddIndex):
+    """
+    На PostgreSQL индекс строится через CREATE INDEX CONCURRENTLY и не
+    блокирует запись в таблицу; на остальных СУБД - обычный AddIndex.
+    Миграция с этой операцией должна быть неатомарной (atomic = False).
+    """
+
+    def _concurrently(self):
+        from django.contrib.postgres.operations import AddIndexConcurrently
+
+        return AddIndexConcurrently(self.model_name, self.index)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            self._concurrently().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+        else:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            self._concurrently().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+        else:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,119 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+from service_backend.models import Friendship
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация по убыванию id: каждая страница - один запрос
+    с условием id < курсор, который обслуживается индексом.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-id'
+
+
+class CreatedAtCursorPagination(IdCursorPagination):
+    """
+    Keyset-пагинация заявок по (created_at, id), новые сверху. Курсор
+    хранит пару "<created_at>,<id>" крайней строки страницы, а не
+    created_at со смещением, как CursorPagination: заявки с одинаковым
+    created_at (после пакетного импорта их тысячи) не повторяются и не
+    теряются. Выборка - словари values() с полями created_at и id.
+    """
+    ordering = ('-created_at', '-id')
+
+    def _position(self, row):
+        return f"{row['created_at'].isoformat()},{row['id']}"
+
+    def _parse_position(self, position):
+        created_at, _, row_id = position.rpartition(',')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not row_id.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, int(row_id)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+        if position is not None:
+            created_at, row_id = self._parse_position(position)
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=row_id))
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
+
+
+class FriendPages:
+    """
+    Друзья пользователя для IdCursorPagination. Поддерживает то, что делает
+    с выборкой пагинация: order_by по id, filter(id__lt=...) или
+    filter(id__gt=...) и срез. Срез выполняется одним запросом
+    Friendship.objects.friends_page, который идёт по индексам, а не
+    сортирует всех друзей.
+    """
+
+    def __init__(self, user, descending=True, before=None, after=None):
+        self.user = user
+        self.descending = descending
+        self.before = before
+        self.after = after
+
+    def _copy(self, **changes):
+        return FriendPages(**{**vars(self), **changes})
+
+    def order_by(self, ordering):
+        if ordering not in ('id', '-id'):
+            raise ValueError(f'Unsupported ordering: {ordering}')
+        return self._copy(descending=ordering == '-id')
+
+    def filter(self, id__lt=None, id__gt=None):
+        return self._copy(
+            before=self.before if id__lt is None else int(id__lt),
+            after=self.after if id__gt is None else int(id__gt),
+        )
+
+    def __getitem__(self, item):
+        start, stop = item.start or 0, item.stop
+        rows = Friendship.objects.friends_page(
+            self.user, stop, self.before, self.after, self.descending)
+        return list(rows)[start:]
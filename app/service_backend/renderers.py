@@ -0,0 +1,64 @@
+"""
+Быстрые JSON-рендерер и парсер для DRF.
+
+Если установлен orjson, ответы кодируются и запросы разбираются им;
+без него используются стандартные JSONRenderer и JSONParser DRF.
+Типы, которых orjson не знает (ленивые строки перевода, Decimal и т. п.),
+кодируются так же, как в DRF, через его JSONEncoder.
+"""
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен
+    orjson = None
+
+_encoder = JSONEncoder()
+# Ключи не-строки приводятся к строкам, как в стандартном json.
+_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def dumps(data):
+    """Кодирует data в JSON (bytes, UTF-8) самым быстрым доступным способом."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_encoder.default, option=_OPTIONS)
+    return JSONRenderer().render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson; с отступами (?indent=) рендерит стандартный."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read() if stream is not None else b'')
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+def constant_response(data, code):
+    """
+    Ответ с неизменным телом: data сериализуется один раз, а каждый вызов
+    возвращает новый HttpResponse с готовыми байтами.
+    """
+    content = dumps(data)
+
+    def response():
+        return HttpResponse(content, status=code, content_type='application/json')
+    return response
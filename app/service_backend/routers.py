@@ -0,0 +1,157 @@
+"""
+Чтение с реплик базы данных.
+
+Реплики задаются в SQL_REPLICAS и получают алиасы replica1, replica2, ...
+По умолчанию все запросы идут в default. Представления, помеченные
+read_from_replica (статусы и списки), читают со случайной реплики,
+выбранной на весь запрос.
+
+Чтобы пользователи видели изменения своих связей, код, который их меняет,
+отмечает затронутых пользователей (mark_written вызывается из
+FriendshipCache.invalidate после коммита), и ReplicaPinMiddleware на
+REPLICA_PIN_SECONDS закрепляет их за основной базой: в это время их
+чтения идут в default. Запросы только на чтение, в том числе POST
+api/status/, никого не закрепляют.
+"""
+import functools
+import inspect
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+
+_read_alias = ContextVar('read_alias', default=None)
+# id пользователей, изменённых текущим запросом (mark_written). В ContextVar
+# лежит изменяемое множество, поэтому отметки из потоков sync_to_async
+# видны middleware.
+_written = ContextVar('replica_written', default=None)
+
+
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def _pins():
+    # Тот же кэш, что у кэша связей: при нескольких воркерах он обязан
+    # быть общим (service_backend.checks), иначе закрепление видно только
+    # процессу, принявшему изменение.
+    return caches[settings.FRIENDSHIP_CACHE_ALIAS]
+
+
+def is_pinned(user):
+    return user is not None and user.is_authenticated and bool(
+        _pins().get(_pin_key(user.pk)))
+
+
+def _pin_entries(user_ids):
+    return {_pin_key(user_id): 1 for user_id in user_ids}
+
+
+def mark_written(*users):
+    """
+    Отмечает пользователей (объекты или id), чьи связи изменил текущий
+    запрос; после ответа ReplicaPinMiddleware закрепит их за основной базой.
+    Вне запроса ничего не делает.
+    """
+    written = _written.get()
+    if written is not None:
+        written.update(getattr(user, 'pk', user) for user in users)
+
+
+@contextmanager
+def replica_reads(user):
+    """Направляет чтения внутри блока на реплику, если user не закреплён."""
+    alias = None
+    if settings.DATABASE_REPLICAS and not is_pinned(user):
+        alias = random.choice(settings.DATABASE_REPLICAS)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Читает внутри блока из default, даже в представлении с репликой."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def read_from_replica(view):
+    """
+    Декоратор для представлений только на чтение: методов ViewSet
+    (self, request, ...) и асинхронных функций (request, ...).
+    """
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_reads(request.user):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        with replica_reads(request.user):
+            return view(self, request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему через репликацию с основной базы.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaPinMiddleware:
+    """
+    Закрепляет за основной базой пользователей, чьи связи изменил запрос.
+    Работает и в синхронном, и в асинхронном стеке.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _written.set(set())
+        try:
+            response = self.get_response(request)
+        finally:
+            written = _written.get()
+            _written.reset(token)
+        if written and settings.DATABASE_REPLICAS:
+            _pins().set_many(_pin_entries(written), timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        token = _written.set(set())
+        try:
+            response = await self.get_response(request)
+        finally:
+            written = _written.get()
+            _written.reset(token)
+        if written and settings.DATABASE_REPLICAS:
+            await _pins().aset_many(_pin_entries(written), timeout=settings.REPLICA_PIN_SECONDS)
+        return response
@@ -1,7 +1,14 @@
+from django.conf import settings
 from rest_framework import serializers
-from django.db.models import Q
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.db.models import Case, CharField, Exists, OuterRef, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
 
-from service_backend.models import User, Application, Friendship
+from service_backend.authentication import USERNAME_CLAIM
+from service_backend.cache import friendship_cache
+from service_backend.hashing import hash_password
+from service_backend.models import User, Application, Friendship, FriendshipStatus
 
 
 class NewUserSerializer(serializers.ModelSerializer):
@@ -19,12 +26,10 @@ class NewUserSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = User.objects.create(
-            username=validated_data['username']
+        return User.objects.create(
+            username=validated_data['username'],
+            password=hash_password(validated_data['password']),
         )
-        user.set_password(validated_data['password'])
-        user.save()
-        return user
 
 
 class ApplicationAcceptSerializer(serializers.ModelSerializer):
@@ -53,45 +58,166 @@ class ApplicationSerializer(serializers.ModelSerializer):
             'created_at',
         )
 
+    # Поля values(), из которых represent_rows строит ответ.
+    ROW_FIELDS = ('id', 'created_at', 'user__username', 'applicant__username')
+
+    @staticmethod
+    def represent_rows(rows):
+        """
+        Быстрый путь только для чтения: словари из values(*ROW_FIELDS)
+        в тот же вид, что отдаёт сериализатор, без объектов моделей и полей DRF.
+        """
+        current_timezone = timezone.get_current_timezone()
+        return [{
+            'id': row['id'],
+            'user': row['user__username'],
+            'applicant': row['applicant__username'],
+            'created_at': format_datetime(row['created_at'], current_timezone),
+        } for row in rows]
+
+
+def format_datetime(value, current_timezone):
+    """То же, что DateTimeField.to_representation с форматом ISO 8601."""
+    value = value.astimezone(current_timezone).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
 
 class FollowSerializer(serializers.ModelSerializer):
-    """ Сериализация: список друзей. """
-    user = serializers.SerializerMethodField()
+    """
+    Сериализация: список друзей.
+    Работает по строкам Friendship.objects.friends_of, где username второй
+    стороны уже выбран в том же запросе.
+    """
+    user = serializers.CharField(source='friend_username', read_only=True)
 
     class Meta:
         model = Friendship
         fields = ('user',)
 
-    def get_user(self, obj):
-        user = self.context['request'].user
-        if user == obj.user1:
-            return obj.user2.username
-        elif user == obj.user2:
-            return obj.user1.username
-        return None
+    @staticmethod
+    def represent_rows(rows):
+        """Быстрый путь только для чтения по строкам friends_of."""
+        return [{'user': row['friend_username']} for row in rows]
 
 
 class StatusSerializer(serializers.Serializer):
     status = serializers.SerializerMethodField()
 
+    @staticmethod
+    def annotate(queryset, request_user):
+        """
+        Добавляет к выборке пользователей поле status: все три связи
+        проверяются подзапросами EXISTS в том же SQL-запросе.
+        """
+        me = request_user.pk
+        return queryset.annotate(
+            is_friend=Exists(Friendship.objects.filter(
+                user1=Least(OuterRef('pk'), Value(me)),
+                user2=Greatest(OuterRef('pk'), Value(me)),
+            )),
+            has_incoming_request=Exists(Application.objects.filter(
+                user=OuterRef('pk'), applicant=me)),
+            has_outgoing_request=Exists(Application.objects.filter(
+                user=me, applicant=OuterRef('pk'))),
+            status=Case(
+                When(is_friend=True, then=Value(FriendshipStatus.FRIENDS)),
+                When(pk=me, then=Value(FriendshipStatus.YOURSELF)),
+                When(has_incoming_request=True, then=Value(FriendshipStatus.INCOMING)),
+                When(has_outgoing_request=True, then=Value(FriendshipStatus.OUTGOING)),
+                default=Value(FriendshipStatus.NOTHING),
+                output_field=CharField(),
+            ),
+        ).order_by()
+
+    @classmethod
+    def resolve(cls, request_user, username):
+        """
+        Статус дружбы; None, если пользователя нет. Берётся из кэша связей,
+        а для пользователей, которых нет в кэше, считается одним SQL-запросом.
+        """
+        relations = friendship_cache.relations(request_user.pk)
+        if relations is not None:
+            other_id = friendship_cache.user_id(username)
+            if other_id is None:
+                return None
+            return relations.status(request_user.pk, other_id)
+        return cls.annotate(
+            User.objects.filter(username=username), request_user,
+        ).values_list('status', flat=True).first()
+
     def get_status(self, username):
-        request_user = self.context['request'].user
-        try:
-            user = User.objects.get(username=username)
-            is_friend = Friendship.objects.filter(
-                Q(user1=user, user2=request_user) | Q(user1=request_user, user2=user)).exists()
-            has_incoming_request = Application.objects.filter(user=user, applicant=request_user).exists()
-            has_outgoing_request = Application.objects.filter(user=request_user, applicant=user).exists()
-
-            if is_friend:
-                return 'Уже друзья'
-            elif user == request_user:
-                return 'Это ты!'
-            elif has_incoming_request:
-                return 'Входящая заявка'
-            elif has_outgoing_request:
-                return 'Исходящая заявка'
-            else:
-                return 'Нет ничего'
-        except User.DoesNotExist:
+        status = self.resolve(self.context['request'].user, username)
+        if status is None:
             return 'Пользователь не найден'
+        return status
+
+
+class StatusBatchSerializer(serializers.Serializer):
+    """
+    Статусы дружбы для списка пользователей. Вычисляются постоянным числом
+    запросов независимо от длины списка; длина ограничена STATUS_BATCH_MAX_SIZE.
+    """
+    usernames = serializers.ListField(
+        child=serializers.CharField(max_length=150),
+        allow_empty=False,
+        max_length=settings.STATUS_BATCH_MAX_SIZE,
+    )
+
+    def to_representation(self, usernames):
+        request_user = self.context['request'].user
+        relations = friendship_cache.relations(request_user.pk)
+        if relations is not None:
+            found = {
+                username: relations.status(request_user.pk, user_id)
+                for username, user_id in User.objects.filter(
+                    username__in=usernames).values_list('username', 'id').order_by()
+            }
+        else:
+            found = dict(StatusSerializer.annotate(
+                User.objects.filter(username__in=usernames), request_user,
+            ).values_list('username', 'status'))
+        return {
+            'statuses': {
+                username: found.get(username, 'Пользователь не найден')
+                for username in usernames
+            }
+        }
+
+
+class BulkApplicationSerializer(serializers.Serializer):
+    """Список пользователей для массовой отправки заявок в друзья."""
+    applicants = serializers.ListField(
+        child=serializers.CharField(max_length=150),
+        allow_empty=False,
+        max_length=settings.BULK_APPLICATION_MAX_SIZE,
+    )
+
+
+class DecisionSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=150)
+    accept = serializers.BooleanField()
+
+
+class BulkDecisionSerializer(serializers.Serializer):
+    """Решения по входящим заявкам для массового принятия/отклонения."""
+    decisions = serializers.ListField(
+        child=DecisionSerializer(),
+        allow_empty=False,
+        max_length=settings.BULK_APPLICATION_MAX_SIZE,
+    )
+
+
+class UsernameTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Пара JWT-токенов, где access-токен содержит username пользователя."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[USERNAME_CLAIM] = user.username
+        return token
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
@@ -0,0 +1,379 @@
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from service_backend.cache import friendship_cache
+from service_backend.graph import FriendGraph
+from service_backend.models import Application, Friendship, FriendshipStatus, User
+
+
+class StatusQueryCountTests(TestCase):
+    """Статус дружбы вычисляется одним SQL-запросом, в том числе без кэша связей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', password='!')
+        cls.friend = User.objects.create(username='friend', password='!')
+        cls.sender = User.objects.create(username='sender', password='!')
+        cls.stranger = User.objects.create(username='stranger', password='!')
+        Friendship.objects.create(user1=cls.user, user2=cls.friend)
+        Application.objects.create(user=cls.sender, applicant=cls.user)
+
+    def setUp(self):
+        caches[settings.FRIENDSHIP_CACHE_ALIAS].clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def assertStatus(self, username, expected):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/status/{username}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], expected)
+
+    def test_single_query_for_each_status(self):
+        self.assertStatus('friend', FriendshipStatus.FRIENDS)
+        self.assertStatus('sender', FriendshipStatus.INCOMING)
+        self.assertStatus('stranger', FriendshipStatus.NOTHING)
+        self.assertStatus('user', FriendshipStatus.YOURSELF)
+
+    def test_single_query_after_own_write(self):
+        response = self.client.post(
+            '/api/application/send/', {'applicant': 'stranger'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertStatus('stranger', FriendshipStatus.OUTGOING)
+
+    def test_unknown_user(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/status/nobody/')
+        self.assertEqual(response.status_code, 400)
+
+
+class FriendListPaginationTests(TestCase):
+    """Страница друзей - один запрос, сколько бы друзей ни было у пользователя."""
+
+    def make_user_with_friends(self, count):
+        users = User.objects.bulk_create(
+            User(username=f'u{i}', password='!') for i in range(count + 1))
+        # Пользователь в середине: часть дружб хранится с ним в user1, часть - в user2.
+        user = users[count // 2]
+        Friendship.objects.bulk_create(
+            Friendship(user1_id=min(user.id, other.id), user2_id=max(user.id, other.id))
+            for other in users if other.id != user.id)
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        return user, client
+
+    def walk(self, client, path):
+        pages = []
+        while path:
+            with self.assertNumQueries(1):
+                response = client.get(path)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['user'] for row in response.json()['results']])
+            path = response.json()['next']
+        return pages
+
+    def test_constant_queries_from_10_to_10000_friends(self):
+        for count in (10, 10000):
+            with self.subTest(count=count):
+                user, client = self.make_user_with_friends(count)
+                pages = self.walk(client, '/api/friend/?page_size=100')[:2]
+                self.assertEqual(len(pages[0]), min(count, 100))
+                Friendship.objects.all().delete()
+                User.objects.all().delete()
+
+    def test_pages_cover_all_friends_in_id_order(self):
+        user, client = self.make_user_with_friends(10)
+        pages = self.walk(client, '/api/friend/?page_size=3')
+        expected = [
+            row['friend_username']
+            for row in Friendship.objects.friends_of(user).order_by('-id')
+        ]
+        self.assertEqual([username for page in pages for username in page], expected)
+        self.assertEqual(len(pages), 4)
+
+        second = client.get(client.get('/api/friend/?page_size=3').json()['next']).json()
+        with self.assertNumQueries(1):
+            previous = client.get(second['previous']).json()
+        self.assertEqual([row['user'] for row in previous['results']], pages[0])
+
+
+class DuplicateApplicationTests(TestCase):
+    """Повтор заявки ловит ограничение уникальности, без отдельной проверки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', password='!')
+        cls.applicant = User.objects.create(username='applicant', password='!')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def send_twice(self, client, path):
+        first = client.post(path, {'applicant': 'applicant'}, format='json')
+        self.assertEqual(first.status_code, 201)
+        second = client.post(path, {'applicant': 'applicant'}, format='json')
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(
+            second.json()['message'], 'Application with this user and applicant already exists.')
+        self.assertEqual(Application.objects.filter(user=self.user).count(), 1)
+
+    def test_sync(self):
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.user)
+        self.send_twice(client, '/api/application/send/')
+
+    def test_async(self):
+        client = APIClient(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.send_twice(client, '/api/async/application/send/')
+
+
+class ReplicaPinTests(TestCase):
+    """Пользователи закрепляются за основной базой только после настоящих изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', password='!')
+        cls.friend = User.objects.create(username='friend', password='!')
+        cls.stranger = User.objects.create(username='stranger', password='!')
+        Friendship.objects.create(user1=cls.user, user2=cls.friend)
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def unfriend(self, username):
+        with mock.patch('service_backend.cache.mark_written') as mark_written, \
+                mock.patch('service_backend.views.friend_graph') as graph, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f'/api/friend/{username}/')
+        return response, mark_written, graph
+
+    def test_unfriend(self):
+        response, mark_written, graph = self.unfriend('friend')
+        self.assertEqual(response.status_code, 204)
+        mark_written.assert_called_once_with(self.user, self.friend.pk)
+        graph.on_friendship_deleted.assert_called_once_with(self.user, self.friend.pk)
+
+    def test_unfriend_stranger(self):
+        response, mark_written, graph = self.unfriend('stranger')
+        self.assertEqual(response.status_code, 400)
+        mark_written.assert_not_called()
+        graph.on_friendship_deleted.assert_not_called()
+
+    def test_failed_bulk_send(self):
+        with mock.patch('service_backend.cache.mark_written') as mark_written, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/application/send/bulk/', {'applicants': ['friend', 'nobody']}, format='json')
+        self.assertEqual([item['code'] for item in response.json()], [400, 404])
+        mark_written.assert_not_called()
+
+
+class ApplicationPaginationTests(TestCase):
+    """Курсор заявок - пара (created_at, id): одинаковое время не ломает страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', password='!')
+        senders = User.objects.bulk_create(
+            User(username=f's{i}', password='!') for i in range(2600))
+        Application.objects.bulk_create(
+            Application(user=sender, applicant=cls.user) for sender in senders)
+        # Как после пакетного импорта: у всех заявок одно и то же время.
+        Application.objects.update(created_at=timezone.now())
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def walk(self, path, key):
+        pages = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.json()['results']])
+            path = response.json()[key]
+        return pages
+
+    def test_pages_with_shared_created_at(self):
+        # Больше offset_cutoff (1000) строк с одним временем подряд.
+        pages = self.walk('/api/application/incoming/?page_size=1000', 'next')
+        expected = list(Application.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual([row_id for page in pages for row_id in page], expected)
+        self.assertEqual([len(page) for page in pages], [1000, 1000, 600])
+
+    def test_previous_pages(self):
+        first = self.client.get('/api/application/incoming/?page_size=1000').json()
+        last = self.client.get(self.client.get(first['next']).json()['next']).json()
+        self.assertIsNone(last['next'])
+        pages = self.walk(last['previous'], 'previous')
+        self.assertEqual(pages[-1], [row['id'] for row in first['results']])
+        self.assertEqual(len(pages), 2)
+
+
+class RelationsCacheLoadTests(TestCase):
+    """Промахи по одному пользователю ставят в очередь одну фоновую загрузку."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', password='!')
+
+    def setUp(self):
+        caches[settings.FRIENDSHIP_CACHE_ALIAS].clear()
+
+    def test_one_load_per_key(self):
+        with mock.patch('service_backend.cache._loader') as loader:
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(3):
+                    self.assertIsNone(friendship_cache.relations(self.user.pk))
+            self.assertEqual(loader.submit.call_count, 1)
+        # Загрузка снимает отметку и кладёт запись: следующий запрос - попадание.
+        friendship_cache._fill(*loader.submit.call_args.args[1:])
+        self.assertEqual(friendship_cache._loading, set())
+        self.assertEqual(friendship_cache.relations(self.user.pk), (frozenset(),) * 3)
+
+    def test_counters_on_metrics(self):
+        before = friendship_cache.stats()
+        friendship_cache.relations(self.user.pk)
+        body = APIClient(SERVER_NAME='localhost').get('/metrics').content.decode()
+        self.assertIn(f"friendship_cache_misses_total {before['misses'] + 1}\n", body)
+        self.assertIn(f"friendship_cache_hits_total {before['hits']}\n", body)
+
+
+class ExportImportRoundTripTests(TestCase):
+    """import_graph сохраняет created_at заявок из выгрузки export_graph."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=username, password='!') for username in ('a', 'b', 'c'))
+        start = timezone.now() - timedelta(days=3)
+        cls.applications = Application.objects.bulk_create([
+            Application(user=users[0], applicant=users[1], created_at=start),
+            Application(user=users[2], applicant=users[1], created_at=start + timedelta(hours=5)),
+        ])
+
+    def round_trip(self, name):
+        expected = set(Application.objects.values_list(
+            'user__username', 'applicant__username', 'created_at'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, name)
+            call_command('export_graph', 'applications', '--format', name.rpartition('.')[2],
+                         '--output', path, stderr=io.StringIO())
+            Application.objects.all().delete()
+            call_command('import_graph', '--applications', path, stdout=io.StringIO())
+        self.assertEqual(set(Application.objects.values_list(
+            'user__username', 'applicant__username', 'created_at')), expected)
+
+    def test_ndjson(self):
+        self.round_trip('applications.ndjson')
+
+    def test_csv(self):
+        self.round_trip('applications.csv')
+
+    def test_without_created_at(self):
+        Application.objects.all().delete()
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as source:
+            source.write('{"user": "a", "applicant": "c"}\n')
+            source.flush()
+            before = timezone.now()
+            call_command('import_graph', '--applications', source.name, stdout=io.StringIO())
+        self.assertGreaterEqual(Application.objects.get().created_at, before)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'COPY is supported only on PostgreSQL.')
+class CopyImportTests(TransactionTestCase):
+    """import_graph --copy: пользователи, дружбы и заявки со счётчиками."""
+
+    def write(self, directory, name, rows):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as target:
+            target.writelines(json.dumps(row) + '\n' for row in rows)
+        return path
+
+    def test_copy(self):
+        created_at = timezone.now() - timedelta(days=1)
+        with tempfile.TemporaryDirectory() as directory:
+            call_command(
+                'import_graph', '--copy', stdout=io.StringIO(),
+                users=self.write(directory, 'users.jsonl', [
+                    {'username': username} for username in ('a', 'b', 'c')]),
+                friendships=self.write(directory, 'friendships.jsonl', [
+                    {'user1': 'b', 'user2': 'a'}, {'user1': 'a', 'user2': 'b'}]),
+                applications=self.write(directory, 'applications.jsonl', [
+                    {'user': 'c', 'applicant': 'a', 'created_at': created_at.isoformat()},
+                    {'user': 'a', 'applicant': 'b'}]),
+            )
+        users = {user.username: user for user in User.objects.all()}
+        self.assertEqual(set(users), {'a', 'b', 'c'})
+        self.assertEqual(Friendship.objects.count(), 1)
+        self.assertEqual(
+            list(Application.objects.values_list('user__username', 'applicant__username', 'created_at')),
+            [('c', 'a', created_at)])
+        self.assertEqual(
+            (users['a'].friend_count, users['a'].incoming_count, users['c'].outgoing_count),
+            (1, 1, 1))
+
+
+class FriendGraphTests(SimpleTestCase):
+
+    def test_from_pairs(self):
+        graph = FriendGraph.from_pairs([(1, 2), (2, 5), (1, 5), (3, 4)])
+        self.assertEqual(graph.friends(1), {2, 5})
+        self.assertEqual(graph.friends(5), {1, 2})
+        self.assertEqual(graph.friends(0), set())
+        self.assertEqual(graph.friends(100), set())
+        self.assertEqual(graph.mutual(1, 2), [5])
+
+    def test_changes_after_build(self):
+        graph = FriendGraph.from_pairs([(1, 2)])
+        graph.add(2, 9)
+        graph.remove(1, 2)
+        self.assertEqual(graph.friends(2), {9})
+        self.assertEqual(graph.suggestions(9, 10), [])
+
+
+class BulkDuplicateTests(TestCase):
+    """Массовые запросы отвечают на каждый элемент, повторы помечаются duplicate."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', password='!')
+        for username in ('a', 'b'):
+            User.objects.create(username=username, password='!')
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_send_bulk(self):
+        response = self.client.post(
+            '/api/application/send/bulk/', {'applicants': ['a', 'b', 'a']}, format='json')
+        self.assertEqual(
+            [(item['applicant'], item['status']) for item in response.json()],
+            [('a', 'success'), ('b', 'success'), ('a', 'duplicate')])
+        self.assertEqual(Application.objects.filter(user=self.user).count(), 2)
+
+    def test_accept_bulk(self):
+        for username in ('a', 'b'):
+            Application.objects.create(user=User.objects.get(username=username), applicant=self.user)
+        response = self.client.put('/api/application/accept/bulk/', {'decisions': [
+            {'username': 'a', 'accept': True},
+            {'username': 'a', 'accept': False},
+            {'username': 'b', 'accept': False},
+        ]}, format='json')
+        self.assertEqual(
+            [(item['username'], item['status'], item['code']) for item in response.json()],
+            [('a', 'success', 201), ('a', 'duplicate', 400), ('b', 'success', 204)])
+        self.assertTrue(Friendship.objects.between(self.user, User.objects.get(username='a')).exists())
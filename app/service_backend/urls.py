@@ -9,8 +9,15 @@ from service_backend.views import (
     UserViewSet,
     ApplicationAcceptViewSet,
     FriendshipViewSet,
-    FriendshipStatusViewSet
+    FriendshipStatusViewSet,
+    FriendGraphViewSet,
+    RelationCountsViewSet,
+    ExportViewSet,
+    TokenRevokeView,
+    UsernameTokenObtainPairView
 )
+from rest_framework_simplejwt.views import TokenRefreshView
+from service_backend import async_views
 from service_backend.yasg import urlpatterns as doc_urls
 
 
@@ -21,16 +28,45 @@ router.register('application', ApplicationViewSet, basename='application')
 urlpatterns = [
     path('', include(router.urls)),
     path('token/', views.obtain_auth_token),
+    path('application/accept/bulk/', ApplicationAcceptViewSet.as_view(
+        {'put': 'bulk_update'}), name='application-bulk-update'),
     path('application/<str:username>/', ApplicationAcceptViewSet.as_view(
         {'put': 'update'}), name='application-update'),
     path('friend/<str:username>/', FriendshipViewSet.as_view(
         {'put': 'update'}), name='friend-update'),
     path('friend/', FriendshipViewSet.as_view(
         {'get': 'list'}), name='friend'),
+    path('status/', FriendshipStatusViewSet.as_view(
+        {'post': 'batch'}), name='status-batch'),
     path('status/<str:username>/', FriendshipStatusViewSet.as_view(
         {'get': 'retrieve'}), name='status'),
-
+    path('counts/', RelationCountsViewSet.as_view(
+        {'get': 'list'}), name='counts'),
+    path('mutual/<str:username>/', FriendGraphViewSet.as_view(
+        {'get': 'mutual'}), name='mutual'),
+    path('suggestions/', FriendGraphViewSet.as_view(
+        {'get': 'suggestions'}), name='suggestions'),
+    path('export/', ExportViewSet.as_view(
+        {'get': 'list'}), name='export'),
+    path('async/', include([
+        path('application/send/', async_views.application_send,
+             name='async-application-send'),
+        path('application/incoming/', async_views.application_incoming,
+             name='async-application-incoming'),
+        path('application/outgoing/', async_views.application_outgoing,
+             name='async-application-outgoing'),
+        path('friend/', async_views.friend_list, name='async-friend'),
+        path('status/<str:username>/', async_views.friendship_status,
+             name='async-status'),
+        path('events/', async_views.events, name='async-events'),
+    ])),
 ]
+if settings.AUTH_JWT:
+    urlpatterns += [
+        path('jwt/create/', UsernameTokenObtainPairView.as_view(), name='jwt-create'),
+        path('jwt/refresh/', TokenRefreshView.as_view(), name='jwt-refresh'),
+        path('jwt/revoke/', TokenRevokeView.as_view(), name='jwt-revoke'),
+    ]
 urlpatterns += doc_urls
 
 if settings.DEBUG:
@@ -1,25 +1,129 @@
 import json
 
-from django.contrib.auth.hashers import make_password
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.response import Response
 from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import action, permission_classes, api_view
-from django.db.models import Q
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from rest_framework.exceptions import ValidationError
 from rest_framework import mixins
 # from drf_yasg.utils import swagger_auto_schema
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
-from service_backend.models import User, Application, Friendship
+from service_backend.models import (
+    User, Application, Friendship, bump_counters, lock_users
+)
 from service_backend.serializers import (
     NewUserSerializer, ApplicationSerializer,
     ApplicationAcceptSerializer, FollowSerializer,
-    StatusSerializer
+    StatusSerializer, StatusBatchSerializer,
+    BulkApplicationSerializer, BulkDecisionSerializer,
+    UsernameTokenObtainPairSerializer, TokenRevokeSerializer
+)
+from service_backend import export
+from service_backend.cache import friendship_cache
+from service_backend.events import (
+    ACCEPTED, APPLICATION, REJECTED, UNFRIENDED, event_broker
 )
+from service_backend.graph import friend_graph
 from service_backend.mixins import CreateViewSet
+from service_backend.pagination import (
+    IdCursorPagination, CreatedAtCursorPagination, FriendPages
+)
+from service_backend.renderers import constant_response
+from service_backend.routers import read_from_replica
+
+SINCE_PARAMETER = openapi.Parameter(
+    'since', openapi.IN_QUERY,
+    description='Вернуть только заявки, созданные после этого момента (ISO 8601).',
+    type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+)
+
+# Ответы с неизменным телом сериализуются один раз при импорте.
+ADD_YOURSELF = constant_response({
+    'status': 'error',
+    'code': status.HTTP_400_BAD_REQUEST,
+    'message': "You can't add yourself as a friend.",
+}, status.HTTP_400_BAD_REQUEST)
+ALREADY_FRIENDS = constant_response({
+    'status': 'error',
+    'code': status.HTTP_400_BAD_REQUEST,
+    'message': 'You are already friends.',
+}, status.HTTP_400_BAD_REQUEST)
+BECAME_FRIENDS = constant_response({
+    'status': 'success',
+    'code': status.HTTP_201_CREATED,
+    'message': 'You became friends.',
+}, status.HTTP_201_CREATED)
+APPLICATION_EXISTS = constant_response({
+    'status': 'error',
+    'code': status.HTTP_400_BAD_REQUEST,
+    'message': 'Application with this user and applicant already exists.',
+}, status.HTTP_400_BAD_REQUEST)
+NO_SUCH_APPLICATION = constant_response({
+    'status': 'error',
+    'code': status.HTTP_400_BAD_REQUEST,
+    'message': 'There are no such requests to accept / reject - send a request first.',
+}, status.HTTP_400_BAD_REQUEST)
+APPLICATION_REJECTED = constant_response({
+    'status': 'success',
+    'code': status.HTTP_204_NO_CONTENT,
+    'message': 'Application rejected.',
+}, status.HTTP_204_NO_CONTENT)
+REQUEST_INCORRECT = constant_response({
+    'status': 'success',
+    'code': status.HTTP_400_BAD_REQUEST,
+    'message': 'The request is incorrect.',
+}, status.HTTP_400_BAD_REQUEST)
+NOT_A_FRIEND = constant_response({
+    'status': 'error',
+    'code': status.HTTP_400_BAD_REQUEST,
+    'message': "You don't have this user as a friend.",
+}, status.HTTP_400_BAD_REQUEST)
+USERNAME_DOES_NOT_EXIST = constant_response({
+    'status': 'error',
+    'message': 'The specified username does not exist.',
+}, status.HTTP_400_BAD_REQUEST)
+EXPORT_BAD_PARAMETERS = constant_response({
+    'status': 'error',
+    'code': status.HTTP_400_BAD_REQUEST,
+    'message': 'Unknown kind, output or scope.',
+}, status.HTTP_400_BAD_REQUEST)
+EXPORT_FORBIDDEN = constant_response({
+    'status': 'error',
+    'code': status.HTTP_403_FORBIDDEN,
+    'message': 'Only administrators can export the whole graph.',
+}, status.HTTP_403_FORBIDDEN)
+TOKEN_INVALID = constant_response({
+    'status': 'error',
+    'code': status.HTTP_400_BAD_REQUEST,
+    'message': 'Token is invalid or expired.',
+}, status.HTTP_400_BAD_REQUEST)
+TOKEN_REVOKED = constant_response({
+    'status': 'success',
+    'code': status.HTTP_204_NO_CONTENT,
+    'message': 'Token revoked.',
+}, status.HTTP_204_NO_CONTENT)
+
+
+def duplicate_result(field, username):
+    """Результат для повтора пользователя в массовом запросе: обработан только первый."""
+    return {
+        field: username,
+        'status': 'duplicate',
+        'code': status.HTTP_400_BAD_REQUEST,
+        'message': 'Duplicate of an earlier item, ignored.',
+    }
 
 
 @permission_classes([permissions.AllowAny, ])
@@ -38,6 +142,25 @@ class ApplicationViewSet(viewsets.GenericViewSet):
     """
     queryset = Application.objects.all()
     serializer_class = ApplicationSerializer
+    pagination_class = CreatedAtCursorPagination
+
+    def _application_page(self, request, queryset):
+        """
+        Страница заявок одним запросом с join на обоих пользователей,
+        сериализуется из values() без объектов моделей.
+        Параметр since оставляет только заявки, созданные после него.
+        """
+        since = request.query_params.get('since')
+        if since:
+            since = parse_datetime(since)
+            if since is None:
+                raise ValidationError({'since': 'Invalid datetime.'})
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(created_at__gt=since)
+        page = self.paginate_queryset(
+            queryset.values(*ApplicationSerializer.ROW_FIELDS))
+        return self.get_paginated_response(ApplicationSerializer.represent_rows(page))
 
     @swagger_auto_schema(
         operation_description="Отправить одному пользователю заявку в друзья другому",
@@ -58,50 +181,140 @@ class ApplicationViewSet(viewsets.GenericViewSet):
         url_path='send',
     )
     def application(self, request):
-        user = get_object_or_404(User, username=request.user.username)
+        user = request.user
         applicant = get_object_or_404(User, username=self.request.data['applicant'])
-        if Application.objects.filter(user=applicant, applicant=user).exists():
-            profiles = Application.objects.filter(user=applicant, applicant=user).first()
-            profiles.delete()
-            Friendship.objects.create(user1=user, user2=applicant)
-            response = {
-                'status': 'success',
-                'code': status.HTTP_201_CREATED,
-                'message': 'You became friends.'
-            }
-            return Response(response, status=status.HTTP_201_CREATED)
-        elif Application.objects.filter(user=user, applicant=applicant).exists():
-            response = {
-                "status": "error",
-                "code": status.HTTP_400_BAD_REQUEST,
-                "message": "Application with this user and applicant already exists."
-            }
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
-        elif user == applicant:
-            response = {
-                "status": "error",
-                "code": status.HTTP_400_BAD_REQUEST,
-                "message": "You can't add yourself as a friend."
-            }
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
-        elif (
-            Friendship.objects.filter(user1=user, user2=applicant).exists() or
-            Friendship.objects.filter(user2=user, user1=applicant).exists()
-        ):
-            response = {
-                "status": "error",
-                "code": status.HTTP_400_BAD_REQUEST,
-                "message": "You are already friends."
-            }
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            serializer = ApplicationSerializer(data={'user': user, 'applicant': applicant})
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=user, applicant=applicant)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if user == applicant:
+            return ADD_YOURSELF()
+        # Пара блокируется, поэтому две встречные заявки не разминутся:
+        # вторая увидит первую и превратит её в дружбу.
+        with transaction.atomic():
+            lock_users(user, applicant)
+            if Friendship.objects.between(user, applicant).exists():
+                return ALREADY_FRIENDS()
+            # Встречная заявка удаляется сразу: если она была, пользователи становятся друзьями.
+            deleted, _ = Application.objects.filter(user=applicant, applicant=user).delete()
+            if deleted:
+                Friendship.objects.create(user1=user, user2=applicant)
+                bump_counters(
+                    (applicant, 'outgoing_count', -1), (user, 'incoming_count', -1),
+                    (user, 'friend_count', 1), (applicant, 'friend_count', 1),
+                )
+                friendship_cache.invalidate(user, applicant)
+                friend_graph.on_friendship_created(user, applicant)
+                event_broker.publish(user, ACCEPTED, applicant)
+                return BECAME_FRIENDS()
+            # Повтор заявки ловит ограничение уникальности. Записей в транзакции
+            # ещё нет, поэтому savepoint не нужен: ошибка откатывает её целиком.
+            try:
+                with transaction.atomic(savepoint=False):
+                    application = Application.objects.create(user=user, applicant=applicant)
+            except IntegrityError:
+                return APPLICATION_EXISTS()
+            bump_counters((user, 'outgoing_count', 1), (applicant, 'incoming_count', 1))
+            friendship_cache.invalidate(user, applicant)
+            event_broker.publish(user, APPLICATION, applicant)
+        serializer = ApplicationSerializer(application)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_description="Отправить заявки в друзья сразу списку пользователей",
+        request_body=BulkApplicationSerializer,
+        responses={
+            200: "Результат для каждого элемента списка, в том же порядке: "
+                 "[{'applicant', 'status', 'code', 'message'}]; повторы - status duplicate.",
+            400: "applicants: список пуст или длиннее BULK_APPLICATION_MAX_SIZE.",
+            401: "Authentication credentials were not provided.",
+            500: "Internal Server Error."
+        },
+    )
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='send/bulk',
+    )
+    def application_bulk(self, request):
+        serializer = BulkApplicationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        usernames = serializer.validated_data['applicants']
+        user = request.user
+        user_ids = dict(User.objects.filter(
+            username__in=usernames).values_list('username', 'id').order_by())
+        targets = set(user_ids.values()) - {user.pk}
+        with transaction.atomic():
+            lock_users(user, *targets)
+            friends = set()
+            for user1_id, user2_id in Friendship.objects.filter(
+                Q(user1=user, user2__in=targets) | Q(user2=user, user1__in=targets)
+            ).values_list('user1_id', 'user2_id').order_by():
+                friends.add(user2_id if user1_id == user.pk else user1_id)
+            incoming = set(Application.objects.filter(
+                user__in=targets, applicant=user).values_list('user_id', flat=True).order_by())
+            outgoing = set(Application.objects.filter(
+                user=user, applicant__in=targets).values_list('applicant_id', flat=True).order_by())
+
+            results, mutual, new, seen = [], [], [], set()
+            for username in usernames:
+                applicant_id = user_ids.get(username)
+                if username in seen:
+                    results.append(duplicate_result('applicant', username))
+                    continue
+                seen.add(username)
+                if applicant_id is None:
+                    code, message = status.HTTP_404_NOT_FOUND, 'Not found.'
+                elif applicant_id == user.pk:
+                    code, message = status.HTTP_400_BAD_REQUEST, "You can't add yourself as a friend."
+                elif applicant_id in friends:
+                    code, message = status.HTTP_400_BAD_REQUEST, 'You are already friends.'
+                elif applicant_id in incoming:
+                    mutual.append(applicant_id)
+                    code, message = status.HTTP_201_CREATED, 'You became friends.'
+                elif applicant_id in outgoing:
+                    code, message = (
+                        status.HTTP_400_BAD_REQUEST,
+                        'Application with this user and applicant already exists.',
+                    )
+                else:
+                    new.append(applicant_id)
+                    code, message = status.HTTP_201_CREATED, 'Application sent.'
+                results.append({
+                    'applicant': username,
+                    'status': 'success' if code == status.HTTP_201_CREATED else 'error',
+                    'code': code,
+                    'message': message,
+                })
+
+            if mutual:
+                Application.objects.filter(user__in=mutual, applicant=user).delete()
+                Friendship.objects.bulk_create(
+                    [Friendship(user1_id=user1_id, user2_id=user2_id)
+                     for user1_id, user2_id in (
+                         Friendship.canonical(user, applicant_id) for applicant_id in mutual)],
+                    ignore_conflicts=True,
+                )
+            if new:
+                Application.objects.bulk_create(
+                    [Application(user=user, applicant_id=applicant_id) for applicant_id in new],
+                    ignore_conflicts=True,
+                )
+            bump_counters(
+                (user, 'incoming_count', -len(mutual)), (user, 'friend_count', len(mutual)),
+                (user, 'outgoing_count', len(new)),
+                *((applicant_id, 'outgoing_count', -1) for applicant_id in mutual),
+                *((applicant_id, 'friend_count', 1) for applicant_id in mutual),
+                *((applicant_id, 'incoming_count', 1) for applicant_id in new),
+            )
+        if mutual or new:
+            friendship_cache.invalidate(user, *mutual, *new)
+        for applicant_id in mutual:
+            friend_graph.on_friendship_created(user, applicant_id)
+        event_broker.publish(user, ACCEPTED, *mutual)
+        event_broker.publish(user, APPLICATION, *new)
+        return Response(results, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_description="Посмотреть пользователю список своих входящих заявок в друзья ",
+        manual_parameters=[SINCE_PARAMETER],
         responses={
             200: "Ok.",
             400: "Bad request.",
@@ -115,16 +328,17 @@ class ApplicationViewSet(viewsets.GenericViewSet):
         permission_classes=(permissions.IsAuthenticated,),
         url_path='incoming',
     )
+    @read_from_replica
     def application_incoming(self, request):
         try:
-            application = Application.objects.filter(applicant=request.user)
-            serializer = ApplicationSerializer(application, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self._application_page(
+                request, Application.objects.filter(applicant=request.user))
         except:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
     @swagger_auto_schema(
         operation_description="Посмотреть пользователю список своих исходящих заявок в друзья ",
+        manual_parameters=[SINCE_PARAMETER],
         responses={
             200: "Ok.",
             400: "Bad request.",
@@ -138,11 +352,11 @@ class ApplicationViewSet(viewsets.GenericViewSet):
         permission_classes=(permissions.IsAuthenticated,),
         url_path='outgoing',
     )
+    @read_from_replica
     def application_outgoing(self, request):
         try:
-            application = Application.objects.filter(user=request.user)
-            serializer = ApplicationSerializer(application, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self._application_page(
+                request, Application.objects.filter(user=request.user))
         except:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -168,48 +382,117 @@ class ApplicationAcceptViewSet(viewsets.ModelViewSet):
     def update(self, request, username):
         try:
             user = get_object_or_404(User, username=username)
-            applicant = get_object_or_404(User, username=request.user.username)
+            applicant = request.user
             accept = self.request.data['accept']
             serializer = ApplicationAcceptSerializer(data={'user': user, 'applicant': applicant, 'accept': accept})
             serializer.is_valid(raise_exception=True)
-            profiles = Application.objects.filter(user=user, applicant=applicant).first()
-            if not profiles:
-                response = {
-                    'status': 'error',
-                    'code': status.HTTP_400_BAD_REQUEST,
-                    'message': 'There are no such requests to accept / reject - send a request first.'
-                }
-                return Response(response, status=status.HTTP_400_BAD_REQUEST)
-            if serializer.validated_data['accept']:
-                profiles.delete()
-                Friendship.objects.create(user1=user, user2=applicant)
-                response = {
-                    'status': 'success',
-                    'code': status.HTTP_201_CREATED,
-                    'message': 'You became friends.'
-                }
-                return Response(response, status=status.HTTP_201_CREATED)
-            else:
-                profiles.delete()
-                response = {
-                    'status': 'success',
-                    'code': status.HTTP_204_NO_CONTENT,
-                    'message': 'Application rejected.'
-                }
-                return Response(response, status=status.HTTP_204_NO_CONTENT)
+            with transaction.atomic():
+                lock_users(user, applicant)
+                deleted, _ = Application.objects.filter(user=user, applicant=applicant).delete()
+                if not deleted:
+                    return NO_SUCH_APPLICATION()
+                friendship_cache.invalidate(user, applicant)
+                if serializer.validated_data['accept']:
+                    Friendship.objects.create(user1=user, user2=applicant)
+                    bump_counters(
+                        (user, 'outgoing_count', -1), (applicant, 'incoming_count', -1),
+                        (user, 'friend_count', 1), (applicant, 'friend_count', 1),
+                    )
+                    friend_graph.on_friendship_created(user, applicant)
+                    event_broker.publish(applicant, ACCEPTED, user)
+                    return BECAME_FRIENDS()
+                else:
+                    bump_counters(
+                        (user, 'outgoing_count', -1), (applicant, 'incoming_count', -1))
+                    event_broker.publish(applicant, REJECTED, user)
+                    return APPLICATION_REJECTED()
         except Exception as e:
-            response = {
-                'status': 'success',
-                'code': status.HTTP_400_BAD_REQUEST,
-                'message': 'The request is incorrect.'
-            }
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+            return REQUEST_INCORRECT()
+
+    @swagger_auto_schema(
+        operation_description="Принять/отклонить сразу несколько входящих заявок в друзья",
+        request_body=BulkDecisionSerializer,
+        responses={
+            200: "Результат для каждого решения, в том же порядке: "
+                 "[{'username', 'status', 'code', 'message'}]; повторы - status duplicate.",
+            400: "decisions: список пуст или длиннее BULK_APPLICATION_MAX_SIZE.",
+            401: "Authentication credentials were not provided.",
+            500: "Internal Server Error."
+        },
+    )
+    def bulk_update(self, request):
+        serializer = BulkDecisionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        decisions = serializer.validated_data['decisions']
+        applicant = request.user
+        user_ids = dict(User.objects.filter(
+            username__in={decision['username'] for decision in decisions},
+        ).values_list('username', 'id').order_by())
+        with transaction.atomic():
+            lock_users(applicant, *user_ids.values())
+            pending = set(Application.objects.filter(
+                user__in=user_ids.values(), applicant=applicant,
+            ).values_list('user_id', flat=True).order_by())
+
+            results, accepted, decided, seen = [], [], [], set()
+            for decision in decisions:
+                username, accept = decision['username'], decision['accept']
+                user_id = user_ids.get(username)
+                if username in seen:
+                    results.append(duplicate_result('username', username))
+                    continue
+                seen.add(username)
+                if user_id is None:
+                    code, message = status.HTTP_404_NOT_FOUND, 'Not found.'
+                elif user_id not in pending:
+                    code, message = (
+                        status.HTTP_400_BAD_REQUEST,
+                        'There are no such requests to accept / reject - send a request first.',
+                    )
+                elif accept:
+                    accepted.append(user_id)
+                    decided.append(user_id)
+                    code, message = status.HTTP_201_CREATED, 'You became friends.'
+                else:
+                    decided.append(user_id)
+                    code, message = status.HTTP_204_NO_CONTENT, 'Application rejected.'
+                results.append({
+                    'username': username,
+                    'status': 'error' if code >= status.HTTP_400_BAD_REQUEST else 'success',
+                    'code': code,
+                    'message': message,
+                })
+
+            if decided:
+                Application.objects.filter(user__in=decided, applicant=applicant).delete()
+            if accepted:
+                Friendship.objects.bulk_create(
+                    [Friendship(user1_id=user1_id, user2_id=user2_id)
+                     for user1_id, user2_id in (
+                         Friendship.canonical(applicant, user_id) for user_id in accepted)],
+                    ignore_conflicts=True,
+                )
+            bump_counters(
+                (applicant, 'incoming_count', -len(decided)),
+                (applicant, 'friend_count', len(accepted)),
+                *((user_id, 'outgoing_count', -1) for user_id in decided),
+                *((user_id, 'friend_count', 1) for user_id in accepted),
+            )
+        if decided:
+            friendship_cache.invalidate(applicant, *decided)
+        for user_id in accepted:
+            friend_graph.on_friendship_created(applicant, user_id)
+        event_broker.publish(applicant, ACCEPTED, *accepted)
+        event_broker.publish(
+            applicant, REJECTED, *(user_id for user_id in decided if user_id not in accepted))
+        return Response(results, status=status.HTTP_200_OK)
 
 
 class FriendshipViewSet(viewsets.ModelViewSet):
     """ViewSet предназначен для взаимодействия в моделью Friendship."""
     queryset = Friendship.objects.all()
     serializer_class = FollowSerializer
+    pagination_class = IdCursorPagination
 
     @swagger_auto_schema(
         operation_description="Посмотреть пользователю список своих друзей ",
@@ -219,10 +502,10 @@ class FriendshipViewSet(viewsets.ModelViewSet):
             500: "Internal Server Error."
         },
     )
+    @read_from_replica
     def list(self, request, *args, **kwargs):
-        user = request.user
-        self.queryset = Friendship.objects.filter(Q(user1=user) | Q(user2=user))
-        return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(FriendPages(request.user))
+        return self.get_paginated_response(FollowSerializer.represent_rows(page))
 
     @swagger_auto_schema(
         operation_description="Удалить пользователю другого пользователя из своих друзей",
@@ -235,12 +518,19 @@ class FriendshipViewSet(viewsets.ModelViewSet):
     )
     def update(self, request, username):
         user = request.user
-        queryset = Friendship.objects.filter(
-            (Q(user1__username=username) & Q(user2=user)) |
-            (Q(user1=user) & Q(user2__username=username))
-        ).first()
-        if queryset:
-            queryset.delete()
+        friend_id = User.objects.filter(
+            username=username).values_list('id', flat=True).first()
+        deleted = 0
+        if friend_id is not None:
+            with transaction.atomic():
+                lock_users(user, friend_id)
+                deleted, _ = Friendship.objects.between(user, friend_id).delete()
+                if deleted:
+                    bump_counters((user, 'friend_count', -1), (friend_id, 'friend_count', -1))
+                    friendship_cache.invalidate(user, friend_id)
+                    friend_graph.on_friendship_deleted(user, friend_id)
+                    event_broker.publish(user, UNFRIENDED, friend_id)
+        if deleted:
             response = {
                 "status": "success",
                 "code": status.HTTP_204_NO_CONTENT,
@@ -248,12 +538,7 @@ class FriendshipViewSet(viewsets.ModelViewSet):
             }
             return Response(response, status=status.HTTP_204_NO_CONTENT)
         else:
-            response = {
-                "status": "error",
-                "code": status.HTTP_400_BAD_REQUEST,
-                "message": f"You don't have this user as a friend."
-            }
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+            return NOT_A_FRIEND()
 
 
 class FriendshipStatusViewSet(viewsets.ViewSet):
@@ -270,18 +555,11 @@ class FriendshipStatusViewSet(viewsets.ViewSet):
             500: "Internal Server Error."
         },
     )
+    @read_from_replica
     def retrieve(self, request, username=None):
-        try:
-            User.objects.get(username=username)
-        except User.DoesNotExist:
-            response = {
-                'status': 'error',
-                'message': 'The specified username does not exist.'
-            }
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
-
-        serializer = StatusSerializer(username, context={'request': request})
-        status_friend = serializer.data['status']
+        status_friend = StatusSerializer.resolve(request.user, username)
+        if status_friend is None:
+            return USERNAME_DOES_NOT_EXIST()
 
         response = {
             'username': username,
@@ -289,3 +567,187 @@ class FriendshipStatusViewSet(viewsets.ViewSet):
         }
 
         return Response(response, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Получить статусы дружбы сразу для списка пользователей",
+        request_body=StatusBatchSerializer,
+        responses={
+            200: "{'statuses': {username: status}}",
+            400: "usernames: список пуст или длиннее STATUS_BATCH_MAX_SIZE.",
+            401: "Authentication credentials were not provided.",
+            500: "Internal Server Error."
+        },
+    )
+    @read_from_replica
+    def batch(self, request):
+        serializer = StatusBatchSerializer(
+            data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        usernames = serializer.validated_data['usernames']
+        return Response(
+            StatusBatchSerializer(usernames, context={'request': request}).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class RelationCountsViewSet(viewsets.ViewSet):
+    """Число друзей, входящих и исходящих заявок пользователя без загрузки списков."""
+
+    @swagger_auto_schema(
+        operation_description="Посмотреть число своих друзей, входящих и исходящих заявок",
+        responses={
+            200: "{'friends': n, 'incoming': n, 'outgoing': n}",
+            401: "Authentication credentials were not provided.",
+            500: "Internal Server Error."
+        },
+    )
+    @read_from_replica
+    def list(self, request):
+        counts = User.objects.filter(pk=request.user.pk).values(
+            'friend_count', 'incoming_count', 'outgoing_count').first()
+        response = {
+            'friends': counts['friend_count'],
+            'incoming': counts['incoming_count'],
+            'outgoing': counts['outgoing_count'],
+        }
+        return Response(response, status=status.HTTP_200_OK)
+
+
+class FriendGraphViewSet(viewsets.ViewSet):
+    """
+    ViewSet для общих друзей и рекомендаций "возможно, вы знакомы".
+    Ответы строятся по индексу графа в памяти (service_backend.graph).
+    """
+
+    @staticmethod
+    def _usernames(user_ids):
+        return dict(User.objects.filter(
+            id__in=user_ids).values_list('id', 'username').order_by())
+
+    @swagger_auto_schema(
+        operation_description="Посмотреть общих друзей с другим пользователем",
+        responses={
+            200: "{'count': n, 'results': [{'user': username}]}",
+            400: "The specified username does not exist.",
+            401: "Authentication credentials were not provided.",
+            500: "Internal Server Error."
+        },
+    )
+    def mutual(self, request, username):
+        other_id = User.objects.filter(
+            username=username).values_list('id', flat=True).first()
+        if other_id is None:
+            return USERNAME_DOES_NOT_EXIST()
+        mutual = friend_graph.get().mutual(request.user.pk, other_id)
+        mutual_page = mutual[:settings.FRIEND_GRAPH_RESULTS_LIMIT]
+        usernames = self._usernames(mutual_page)
+        response = {
+            'count': len(mutual),
+            'results': [
+                {'user': usernames[user_id]}
+                for user_id in mutual_page if user_id in usernames
+            ],
+        }
+        return Response(response, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Посмотреть возможных друзей, по убыванию числа общих друзей",
+        responses={
+            200: "[{'user': username, 'mutual_friends': n}]",
+            401: "Authentication credentials were not provided.",
+            500: "Internal Server Error."
+        },
+    )
+    def suggestions(self, request):
+        suggestions = friend_graph.get().suggestions(
+            request.user.pk, settings.FRIEND_GRAPH_RESULTS_LIMIT)
+        usernames = self._usernames([user_id for user_id, _ in suggestions])
+        response = [
+            {'user': usernames[user_id], 'mutual_friends': count}
+            for user_id, count in suggestions if user_id in usernames
+        ]
+        return Response(response, status=status.HTTP_200_OK)
+
+
+class ExportViewSet(viewsets.ViewSet):
+    """
+    Потоковая выгрузка дружб и заявок пользователя (или всего графа для
+    администратора) в NDJSON или CSV, со сжатием gzip по Accept-Encoding.
+    Формат задаётся параметром output: параметр format занят DRF под
+    выбор рендерера.
+    """
+
+    @swagger_auto_schema(
+        operation_description="Выгрузить свои дружбы или заявки; scope=all - весь граф (только для администратора)",
+        manual_parameters=[
+            openapi.Parameter(
+                'kind', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=list(export.KINDS), default='friendships'),
+            openapi.Parameter(
+                'output', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=list(export.FORMATS), default='ndjson'),
+            openapi.Parameter(
+                'scope', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=['user', 'all'], default='user'),
+        ],
+        responses={
+            200: "Поток строк NDJSON или CSV.",
+            400: "Unknown kind, output or scope.",
+            401: "Authentication credentials were not provided.",
+            403: "Only administrators can export the whole graph.",
+            500: "Internal Server Error."
+        },
+    )
+    def list(self, request):
+        kind = request.query_params.get('kind', 'friendships')
+        output_format = request.query_params.get('output', 'ndjson')
+        scope = request.query_params.get('scope', 'user')
+        if kind not in export.KINDS or output_format not in export.FORMATS \
+                or scope not in ('user', 'all'):
+            return EXPORT_BAD_PARAMETERS()
+        # request.user собран из кэша токенов без is_staff, поэтому
+        # права администратора проверяются по базе.
+        if scope == 'all' and not User.objects.filter(
+                pk=request.user.pk, is_staff=True).exists():
+            return EXPORT_FORBIDDEN()
+        chunks = export.stream(
+            kind, output_format, None if scope == 'all' else request.user)
+        compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+        response = StreamingHttpResponse(
+            export.gzipped(chunks) if compress else chunks,
+            content_type=f'{export.FORMATS[output_format]}; charset=utf-8',
+        )
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        response['Content-Disposition'] = (
+            f'attachment; filename="{kind}.{output_format}"')
+        return response
+
+
+class TokenRevokeView(APIView):
+    """Отзыв refresh-токена: токен попадает в чёрный список и больше не продлевается."""
+    permission_classes = (permissions.AllowAny,)
+
+    @swagger_auto_schema(
+        operation_description="Отозвать refresh-токен (выйти из сессии)",
+        request_body=TokenRevokeSerializer,
+        responses={
+            204: "Token revoked.",
+            400: "Token is invalid or expired.",
+            500: "Internal Server Error."
+        },
+    )
+    def post(self, request):
+        serializer = TokenRevokeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            RefreshToken(serializer.validated_data['refresh']).blacklist()
+        except TokenError:
+            return TOKEN_INVALID()
+        return TOKEN_REVOKED()
+
+
+class UsernameTokenObtainPairView(TokenObtainPairView):
+    """Выдаёт пару JWT-токенов; access-токен содержит id и username."""
+    serializer_class = UsernameTokenObtainPairSerializer